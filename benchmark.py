@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from viterbi import baseline_model
+from model import hmm_model
+from extra import extra_model
+import utils
+
+"""
+Reproducible benchmark of training and decoding throughput of the taggers.
+Every algorithm is trained on the training file and run on each test file, at several
+corpus scales made by replicating both, and the results are written as JSON.
+"""
+
+algorithms = {
+    'baseline': baseline_model,
+    'viterbi_p1': lambda: hmm_model(k=0.00001, hapax=False),
+    'viterbi_p2': lambda: hmm_model(k=0.00001, hapax=True),
+    'extra': extra_model,
+}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) > 0 else None
+
+
+def run(make_model, train_set, test_set, latency_sample, repeat):
+    test = utils.strip_tags(test_set)
+    no_of_tokens = sum(len(sentence) for sentence in test)
+
+    # best of repeat runs, the least disturbed by the rest of the machine
+    train_seconds = decode_seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model = make_model().fit(train_set)
+        train_seconds = min(train_seconds, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        predictions = model.tag(test)
+        decode_seconds = min(decode_seconds, time.perf_counter() - start)
+    accuracy = utils.evaluate_accuracies(predictions, test_set)[0]
+
+    latencies = []
+    for sentence in latency_sample:
+        start = time.perf_counter()
+        model.tag([sentence])
+        latencies.append(time.perf_counter() - start)
+
+    # peak memory in a separate run, tracemalloc slows down allocation heavy code
+    tracemalloc.start()
+    make_model().fit(train_set).tag(test)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'train_seconds': train_seconds,
+        'decode_seconds': decode_seconds,
+        'tokens': no_of_tokens,
+        'tokens_per_second': no_of_tokens / decode_seconds,
+        'latency_p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'latency_p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'peak_memory_bytes': peak_memory,
+        'accuracy': accuracy,
+    }
+
+
+def compare(results, previous_file, tolerance):
+    with open(previous_file, 'r', encoding='UTF-8') as f:
+        previous = {(entry['algorithm'], entry['test_file'], entry['scale']): entry for entry in json.load(f)['results']}
+    regressions = 0
+    for entry in results:
+        old = previous.get((entry['algorithm'], entry['test_file'], entry['scale']))
+        if old == None:
+            continue
+        speed = entry['tokens_per_second'] / old['tokens_per_second']
+        train = old['train_seconds'] / entry['train_seconds']
+        flag = ''
+        if speed < 1 - tolerance or train < 1 - tolerance:
+            flag = '  <-- regression'
+            regressions += 1
+        print("{} {} x{}: decode speed x{:.2f}, train speed x{:.2f}{}".format(
+            entry['algorithm'], entry['test_file'], entry['scale'], speed, train, flag))
+    return regressions
+
+
+def main(args):
+    random.seed(args.seed)
+    train_base = utils.load_dataset(args.training_file)
+    test_bases = {test_file: utils.load_dataset(test_file) for test_file in args.test_files}
+
+    results = []
+    for scale in args.scales:
+        train_set = train_base * scale
+        for test_file, test_base in test_bases.items():
+            test_set = test_base * scale
+            latency_sample = random.sample(utils.strip_tags(test_base), min(args.latency_sample, len(test_base)))
+            for name in args.algorithms:
+                print("Running {} on {} x{}...".format(name, test_file, scale), file=sys.stderr)
+                entry = {'algorithm': name, 'test_file': test_file, 'scale': scale}
+                entry.update(run(algorithms[name], train_set, test_set, latency_sample, args.repeat))
+                results.append(entry)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'training_file': args.training_file,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output_file, 'w', encoding='UTF-8') as f:
+        json.dump(report, f, indent=2)
+    print("Wrote {}".format(args.output_file), file=sys.stderr)
+
+    if args.compare_file != None:
+        if compare(results, args.compare_file, args.tolerance) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP4 HMM benchmark')
+    parser.add_argument('--train', dest='training_file', type=str, default='data/masc-training.txt',
+                        help='the file of the training data')
+    parser.add_argument('--test', dest='test_files', type=str, nargs='+', default=['data/brown-dev.txt', 'data/masc-dev.txt'],
+                        help='the files of the testing data')
+    parser.add_argument('--algorithms', dest='algorithms', nargs='+', choices=list(algorithms), default=list(algorithms),
+                        help='the algorithms to benchmark')
+    parser.add_argument('--scales', dest='scales', type=int, nargs='+', default=[1, 2, 4],
+                        help='the number of times the training and testing data are replicated')
+    parser.add_argument('--latency-sample', dest='latency_sample', type=int, default=1000,
+                        help='the number of test sentences tagged one at a time to measure latency')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=3,
+                        help='the number of times training and decoding are timed, the fastest run is reported')
+    parser.add_argument('--seed', dest='seed', type=int, default=0,
+                        help='the seed of the latency sample')
+    parser.add_argument('--output', dest='output_file', type=str, default='benchmark.json',
+                        help='the file to write the JSON results to')
+    parser.add_argument('--compare', dest='compare_file', type=str,
+                        help='a previous JSON results file, exits with status 1 if any throughput regressed')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=0.1,
+                        help='the relative slowdown against --compare that counts as a regression')
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,195 @@
+from array import array
+import zlib
+
+import numpy as np
+
+class training_counts:
+    '''
+    Sufficient statistics of the HMM tagger, collected in a single pass over the training sentences.
+    Words and tags are interned to integer ids in order of first appearance, and every count is kept
+    in a numpy array indexed by those ids. The sentences may come from a generator, only chunk_size
+    tokens worth of ids are buffered at a time. add() may be called again with more sentences, and
+    only touches the counts of what they contain. The counts of separate shards of a corpus can be merged,
+    which gives the same counts, with the same ids, as adding the shards one after the other.
+        counts = training_counts().add(utils.iter_dataset('data/masc-training.txt'))
+        counts = training_counts().add(shard1).merge(training_counts().add(shard2))
+    '''
+
+    def __init__(self, chunk_size=1 << 20):
+        self.chunk_size = chunk_size
+        self.word_index = dict()                                         # word -> word id
+        self.tag_index = dict()                                          # tag -> tag id
+        self.sentence_count = 0
+        self.word_tag_rows = np.zeros((0, 0), dtype=np.int64)           # word_tag_counts with spare rows, so new words do not copy it every time
+        self.tag_initial_counts = np.zeros(0, dtype=np.int64)           # [tag id] number of sentences starting with a tag
+        self.tag_transition_counts = np.zeros((0, 0), dtype=np.int64)   # [previous tag id, next tag id] number of times a tag is followed by another
+        self.hapax_counts = np.zeros(0, dtype=np.int64)                 # [tag id] number of words which occur exactly once with a tag
+        self.tail_tag_counts = np.zeros(0, dtype=np.int64)              # [tag id] tags of the words left out of a restricted vocabulary
+
+    @property
+    def word_tag_counts(self):
+        # [word id, tag id] number of times a word is a particular POS
+        return self.word_tag_rows[:len(self.word_index)]
+
+    @property
+    def tags(self):
+        return list(self.tag_index)
+
+    @property
+    def tag_counts(self):
+        return self.word_tag_counts.sum(axis=0) + self.tail_tag_counts
+
+    def add(self, sentences):
+        '''
+        input:  iterable of training sentences, each a list of (word, tag) pairs
+        output: the counts themselves
+        '''
+        word_index = self.word_index
+        tag_index = self.tag_index
+        word_ids = array('q')
+        tag_ids = array('q')
+        sentence_starts = array('b')    # 1 for the first token of a sentence
+
+        for sentence in sentences:
+            self.sentence_count += 1
+            is_first = 1
+            for word, tag in sentence:
+                word_id = word_index.get(word)
+                if word_id is None:
+                    word_id = word_index[word] = len(word_index)
+                tag_id = tag_index.get(tag)
+                if tag_id is None:
+                    tag_id = tag_index[tag] = len(tag_index)
+                word_ids.append(word_id)
+                tag_ids.append(tag_id)
+                sentence_starts.append(is_first)
+                is_first = 0
+
+            if len(word_ids) >= self.chunk_size:
+                self._flush(word_ids, tag_ids, sentence_starts)
+                word_ids, tag_ids, sentence_starts = array('q'), array('q'), array('b')
+
+        self._flush(word_ids, tag_ids, sentence_starts)
+        return self
+
+    def merge(self, other):
+        '''
+        input:  training_counts of sentences which come after the ones of these counts
+        output: the counts themselves, with the counts of other added. Other's word and tag ids are mapped
+                to these counts' ids, and the hapax counts are derived again from the merged word counts,
+                since a word seen once in each shard is not hapax.
+        '''
+        word_index = self.word_index
+        tag_index = self.tag_index
+        word_map = np.array([word_index.setdefault(word, len(word_index)) for word in other.word_index], dtype=np.intp)
+        tag_map = np.array([tag_index.setdefault(tag, len(tag_index)) for tag in other.tag_index], dtype=np.intp)
+        self._grow(len(word_index), len(tag_index))
+        self.sentence_count += other.sentence_count
+        if len(word_map) == 0:
+            return self
+
+        self.hapax_counts -= (self.word_tag_rows[word_map] == 1).sum(axis=0)
+        self.word_tag_rows[np.ix_(word_map, tag_map)] += other.word_tag_counts
+        self.hapax_counts += (self.word_tag_rows[word_map] == 1).sum(axis=0)
+
+        self.tag_initial_counts[tag_map] += other.tag_initial_counts
+        self.tail_tag_counts[tag_map] += other.tail_tag_counts
+        self.tag_transition_counts[np.ix_(tag_map, tag_map)] += other.tag_transition_counts
+        return self
+
+    def restrict(self, max_words=None, min_count=None, hash_buckets=0):
+        '''
+        Copy of the counts with a bounded vocabulary: only the max_words most frequent words (ties broken by first
+        appearance), and/or the words seen at least min_count times, keep their own counts and ids in the same order.
+        The counts of the other words are summed into hash_buckets pseudo-words, chosen by a hash of the word
+        (see bucket_word), or only kept in tail_tag_counts if hash_buckets is 0. The tag, transition and hapax counts
+        stay those of the whole vocabulary, the rare words the policy merges are the ones hapax smoothing learns from.
+        '''
+        word_counts = self.word_tag_counts.sum(axis=1)
+        keep = np.ones(len(word_counts), dtype=bool)
+        if min_count is not None:
+            keep &= word_counts >= min_count
+        if max_words is not None and keep.sum() > max_words:
+            order = np.argsort(-word_counts, kind='stable')
+            top = np.zeros_like(keep)
+            top[order[keep[order]][:max_words]] = True
+            keep = top
+
+        words = list(self.word_index)
+        kept_ids = np.flatnonzero(keep)
+        restricted = training_counts(self.chunk_size)
+        restricted.word_index = {words[word_id]: i for i, word_id in enumerate(kept_ids.tolist())}
+        restricted.tag_index = dict(self.tag_index)
+        rows = [self.word_tag_counts[kept_ids]]
+        restricted.tail_tag_counts = self.tail_tag_counts.copy()
+        if hash_buckets == 0:
+            restricted.tail_tag_counts += self.word_tag_counts[~keep].sum(axis=0)
+        else:
+            tail_ids = np.flatnonzero(~keep)
+            buckets = np.array([_bucket(words[word_id], hash_buckets) for word_id in tail_ids.tolist()], dtype=np.intp)
+            bucket_rows = np.zeros((hash_buckets, len(self.tag_index)), dtype=np.int64)
+            np.add.at(bucket_rows, buckets, self.word_tag_counts[tail_ids])
+            # empty buckets are left out, the words hashed to them are unknown words
+            used = np.flatnonzero(bucket_rows.sum(axis=1) > 0)
+            for bucket in used.tolist():
+                restricted.word_index[_bucket_name(bucket)] = len(restricted.word_index)
+            rows.append(bucket_rows[used])
+        restricted.word_tag_rows = np.concatenate(rows)
+        restricted.sentence_count = self.sentence_count
+        restricted.tag_initial_counts = self.tag_initial_counts.copy()
+        restricted.tag_transition_counts = self.tag_transition_counts.copy()
+        restricted.hapax_counts = self.hapax_counts.copy()
+        return restricted
+
+    def __getstate__(self):
+        # the spare rows are not worth sending to another process
+        state = dict(self.__dict__)
+        state['word_tag_rows'] = self.word_tag_counts
+        return state
+
+    def _flush(self, word_ids, tag_ids, sentence_starts):
+        self._grow(len(self.word_index), len(self.tag_index))
+        if len(word_ids) == 0:
+            return
+        word_ids = np.frombuffer(word_ids, dtype=np.int64)
+        tag_ids = np.frombuffer(tag_ids, dtype=np.int64)
+        sentence_starts = np.frombuffer(sentence_starts, dtype=np.int8).astype(bool)
+
+        # only the rows of the words in this chunk can change which words are hapax
+        touched_words = np.unique(word_ids)
+        self.hapax_counts -= (self.word_tag_rows[touched_words] == 1).sum(axis=0)
+        np.add.at(self.word_tag_rows, (word_ids, tag_ids), 1)
+        self.hapax_counts += (self.word_tag_rows[touched_words] == 1).sum(axis=0)
+
+        np.add.at(self.tag_initial_counts, tag_ids[sentence_starts], 1)
+        # a transition ends at every token that does not start a sentence
+        follows = ~sentence_starts[1:]
+        np.add.at(self.tag_transition_counts, (tag_ids[:-1][follows], tag_ids[1:][follows]), 1)
+
+    def _grow(self, no_of_words, no_of_tags):
+        old_capacity, old_tags = self.word_tag_rows.shape
+        if no_of_words > old_capacity or no_of_tags > old_tags:
+            capacity = old_capacity if no_of_words <= old_capacity else max(no_of_words, 2 * old_capacity)
+            word_tag_rows = np.zeros((capacity, no_of_tags), dtype=np.int64)
+            word_tag_rows[:old_capacity, :old_tags] = self.word_tag_rows
+            self.word_tag_rows = word_tag_rows
+        if no_of_tags > old_tags:
+            self.tag_initial_counts = np.concatenate((self.tag_initial_counts, np.zeros(no_of_tags - old_tags, dtype=np.int64)))
+            self.hapax_counts = np.concatenate((self.hapax_counts, np.zeros(no_of_tags - old_tags, dtype=np.int64)))
+            self.tail_tag_counts = np.concatenate((self.tail_tag_counts, np.zeros(no_of_tags - old_tags, dtype=np.int64)))
+            tag_transition_counts = np.zeros((no_of_tags, no_of_tags), dtype=np.int64)
+            tag_transition_counts[:old_tags, :old_tags] = self.tag_transition_counts
+            self.tag_transition_counts = tag_transition_counts
+
+def bucket_word(word, hash_buckets):
+    '''
+    Pseudo-word of the hashed bucket of a word outside a restricted vocabulary, see training_counts.restrict.
+    crc32 rather than hash(), which differs between processes.
+    '''
+    return _bucket_name(_bucket(word, hash_buckets))
+
+def _bucket(word, hash_buckets):
+    return zlib.crc32(word.encode('UTF-8')) % hash_buckets
+
+def _bucket_name(bucket):
+    return '<bucket-{}>'.format(bucket)
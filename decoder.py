@@ -0,0 +1,505 @@
+import threading
+import time
+
+import numpy as np
+
+class trellis_workspace(threading.local):
+    '''
+    Trellis buffers reused by every sentence and batch a decoder is given them for, instead of allocating a new trellis
+    each time. They grow to the largest trellis seen so far and are only reallocated to grow, so decoding a stream of
+    batches allocates a bounded, predictable amount of memory: one byte per (word, tag) for the backpointers, which
+    are stored as the smallest integer type that holds every tag id (int8 up to 127 tags).
+    The buffers are thread-local, so threads decoding with the same workspace at the same time each get their own,
+    and a workspace pickles empty, so every process gets its own too.
+        workspace = trellis_workspace()
+        paths = viterbi_decode_batch(..., workspace=workspace)
+    '''
+
+    def __init__(self):
+        self.backpointer_buffer = np.zeros(0, dtype=np.int8)
+        self.candidate_buffer = np.zeros(0)
+        self.best_buffer = np.zeros(0, dtype=np.intp)
+
+    def __reduce__(self):
+        return (trellis_workspace, ())
+
+    def backpointers(self, shape):
+        no_of_tags = shape[-1]
+        dtype = np.int8 if no_of_tags <= 127 else np.int16 if no_of_tags <= 32767 else np.intp
+        if self.backpointer_buffer.dtype != dtype:
+            self.backpointer_buffer = np.zeros(0, dtype=dtype)
+        self.backpointer_buffer = _grown(self.backpointer_buffer, shape)
+        return self.backpointer_buffer[:np.prod(shape)].reshape(shape)
+
+    def candidates(self, shape, dtype=np.float64):
+        if self.candidate_buffer.dtype != dtype:
+            self.candidate_buffer = np.zeros(0, dtype=dtype)
+        self.candidate_buffer = _grown(self.candidate_buffer, shape)
+        return self.candidate_buffer[:np.prod(shape)].reshape(shape)
+
+    def best(self, shape):
+        self.best_buffer = _grown(self.best_buffer, shape)
+        return self.best_buffer[:np.prod(shape)].reshape(shape)
+
+# Score of the impossible states in integer (fixed-point) trellises, which have no -inf. It is far below any real
+# path score, and a few of them can be added together without overflowing int64.
+IMPOSSIBLE_SCORE = -(1 << 58)
+
+def impossible_score(dtype):
+    return -np.inf if np.issubdtype(dtype, np.floating) else IMPOSSIBLE_SCORE
+
+def _alive(scores):
+    # states with a possible path
+    if np.issubdtype(scores.dtype, np.floating):
+        return scores > -np.inf
+    return scores > IMPOSSIBLE_SCORE // 2
+
+def _grown(buffer, shape):
+    # the contents of the buffers do not need to survive a call, so growing does not copy them
+    size = int(np.prod(shape))
+    if buffer.size < size:
+        return np.empty(max(size, 2 * buffer.size), dtype=buffer.dtype)
+    return buffer
+
+def viterbi_decode(log_initial, log_transition, emission_rows, relabel=None, beam_width=None, beam_threshold=None, instruments=None, workspace=None):
+    '''
+    Vectorized Viterbi decoding of a single sentence over dense log10 tables indexed by tag id.
+    input:  log_initial     (no_of_tags,) log P(tag|starting_position)
+            log_transition  (no_of_tags, no_of_tags) log P(tag_curr|tag_prev), indexed [tag_prev, tag_curr]
+            emission_rows   (sentence_length, no_of_tags) log P(word|tag) of each word, -inf for tags the word can not take.
+                            The tables may instead all be integer (fixed-point) scores, with IMPOSSIBLE_SCORE for -inf,
+                            the whole trellis is then computed in integer arithmetic
+            relabel         optional (sentence_length,) tag ids, where >= 0 every state of that position is collapsed
+                            into the best one, which is then given that tag (used for the suffix rules of extra)
+            beam_width      optional, only the beam_width best states of each position are extended to the next one, ties broken towards the lowest tag id
+            beam_threshold  optional, only the states within beam_threshold (in log10) of the best state of each position are extended
+            instruments     optional profiler.instrumentation, given the trellis and backtracking times and the trellis counters
+            workspace       optional trellis_workspace whose buffers are used for the trellis
+    output: list of the best tag ids, one per word
+    '''
+    sentence_length, no_of_tags = emission_rows.shape
+    if sentence_length == 0:
+        return []
+
+    start = time.perf_counter()
+    if workspace is None:
+        workspace = trellis_workspace()
+    tag_range = np.arange(no_of_tags)
+    backpointers = workspace.backpointers((sentence_length, no_of_tags))
+    candidates = workspace.candidates((no_of_tags, no_of_tags), np.result_type(emission_rows, log_transition))     # candidates[tag_prev, tag_curr]
+    best_prev = workspace.best((no_of_tags,))
+
+    scores = log_initial + emission_rows[0]
+    if relabel is not None and relabel[0] >= 0:
+        scores = _collapse(scores, backpointers[0], relabel[0])
+
+    beam = beam_width is not None or beam_threshold is not None
+    for index in range(1, sentence_length):
+        if beam:
+            scores = _prune(scores, beam_width, beam_threshold)
+        if instruments is not None:
+            instruments.count('trellis_steps')
+            instruments.count('states_expanded', int(_alive(scores).sum()))
+        np.add(scores[:, None], log_transition, out=candidates)
+        candidates.argmax(axis=0, out=best_prev)
+        backpointers[index] = best_prev
+        scores = emission_rows[index] + candidates[best_prev, tag_range]
+        if relabel is not None and relabel[index] >= 0:
+            scores = _collapse(scores, backpointers[index], relabel[index])
+
+    if instruments is not None:
+        instruments.add_time('trellis', time.perf_counter() - start)
+        start = time.perf_counter()
+
+    # backtracking
+    backpointers = backpointers.tolist()
+    path = [int(scores.argmax())]
+    for index in range(sentence_length - 1, 0, -1):
+        path.append(backpointers[index][path[-1]])
+    path.reverse()
+    if instruments is not None:
+        instruments.add_time('backtracking', time.perf_counter() - start)
+    return path
+
+def _prune(scores, beam_width, beam_threshold):
+    # sets every state outside the beam to -inf, along the last axis
+    impossible = impossible_score(scores.dtype)
+    if beam_threshold is not None:
+        scores = np.where(scores < scores.max(axis=-1, keepdims=True) - beam_threshold, impossible, scores)
+    if beam_width is not None and beam_width < scores.shape[-1]:
+        pruned = np.full_like(scores, impossible)
+        kept = _beam_states(scores, beam_width)
+        np.put_along_axis(pruned, kept, np.take_along_axis(scores, kept, axis=-1), axis=-1)
+        scores = pruned
+    return scores
+
+def _beam_states(scores, beam_width):
+    # ids of the beam_width best states along the last axis, in increasing order. Ties are broken towards the
+    # lowest tag id, like the argmax of the exact decoder, so both decoders keep the same states.
+    return np.sort(np.argsort(-scores, axis=-1, kind='stable')[..., :beam_width], axis=-1)
+
+def _collapse(scores, backpointer_row, tag):
+    best = scores.argmax()
+    backpointer_row[tag] = backpointer_row[best]
+    collapsed = np.full_like(scores, impossible_score(scores.dtype))
+    collapsed[tag] = scores[best]
+    return collapsed
+
+def viterbi_decode_batch(log_initial, log_transition, emission_rows, lengths, relabel=None, beam_width=None, beam_threshold=None, instruments=None, workspace=None):
+    '''
+    Vectorized Viterbi decoding of a batch of sentences at once, the trellis of every sentence is one row of a (batch x tags) array.
+    input:  log_initial     (no_of_tags,) log P(tag|starting_position)
+            log_transition  (no_of_tags, no_of_tags) log P(tag_curr|tag_prev), indexed [tag_prev, tag_curr]
+            emission_rows   (batch_size, max_length, no_of_tags) log P(word|tag) of each word, padded past the end of each sentence
+            lengths         (batch_size,) sentence lengths, sorted in decreasing order and all > 0
+            relabel         optional (batch_size, max_length) tag ids, see viterbi_decode
+            beam_width      optional, see viterbi_decode, only the (batch x beam_width x tags) candidates of the kept states are computed
+            beam_threshold  optional, see viterbi_decode
+            instruments     optional, see viterbi_decode
+            workspace       optional, see viterbi_decode
+    output: list of lists of the best tag ids, one list per sentence
+    '''
+    start = time.perf_counter()
+    batch_size, max_length, no_of_tags = emission_rows.shape
+    lengths = np.asarray(lengths)
+    # Sentences are sorted by decreasing length, so the ones still being decoded at each
+    # position are a prefix of the batch and the padding is masked out by slicing
+    active_counts = (lengths[None, :] > np.arange(max_length)[:, None]).sum(axis=1)
+
+    if workspace is None:
+        workspace = trellis_workspace()
+    # rows past the end of a sentence are never read, so the reused buffers are not cleared
+    backpointers = workspace.backpointers((batch_size, max_length, no_of_tags))
+    candidate_buffer = workspace.candidates((batch_size, no_of_tags, no_of_tags), np.result_type(emission_rows, log_transition))
+    best_buffer = workspace.best((batch_size, no_of_tags))
+    scores = log_initial + emission_rows[:, 0]
+    if relabel is not None:
+        _collapse_batch(scores, backpointers[:, 0], relabel[:, 0])
+
+    for index in range(1, max_length):
+        active = active_counts[index]
+        if beam_width is not None and beam_width < no_of_tags:
+            previous_scores = _prune(scores[:active], None, beam_threshold)
+            kept = _beam_states(previous_scores, beam_width)
+            candidates = np.take_along_axis(previous_scores, kept, axis=1)[:, :, None] + log_transition[kept]   # candidates[sentence, kept state, tag_curr]
+            best_kept = candidates.argmax(axis=1)
+            best_prev = np.take_along_axis(kept, best_kept, axis=1)
+        else:
+            previous_scores = scores[:active] if beam_threshold is None else _prune(scores[:active], None, beam_threshold)
+            candidates = np.add(previous_scores[:, :, None], log_transition, out=candidate_buffer[:active])     # candidates[sentence, tag_prev, tag_curr]
+            best_kept = best_prev = candidates.argmax(axis=1, out=best_buffer[:active])
+        if instruments is not None:
+            instruments.count('trellis_steps', int(active))
+            expanded = _alive(previous_scores).sum(axis=1)
+            instruments.count('states_expanded', int(expanded.sum() if beam_width is None else np.minimum(expanded, beam_width).sum()))
+        backpointers[:active, index] = best_prev
+        scores[:active] = emission_rows[:active, index] + np.take_along_axis(candidates, best_kept[:, None, :], axis=1)[:, 0]
+        if relabel is not None:
+            _collapse_batch(scores[:active], backpointers[:active, index], relabel[:active, index])
+
+    if instruments is not None:
+        instruments.add_time('trellis', time.perf_counter() - start)
+        start = time.perf_counter()
+
+    # backtracking
+    rows = np.arange(batch_size)
+    paths = np.zeros((batch_size, max_length), dtype=np.intp)
+    paths[rows, lengths - 1] = scores.argmax(axis=1)
+    for index in range(max_length - 1, 0, -1):
+        active = active_counts[index]
+        paths[:active, index - 1] = backpointers[rows[:active], index, paths[:active, index]]
+    paths = [path[:length] for path, length in zip(paths.tolist(), lengths.tolist())]
+    if instruments is not None:
+        instruments.add_time('backtracking', time.perf_counter() - start)
+    return paths
+
+def _collapse_batch(scores, backpointers, tags):
+    rows = np.flatnonzero(tags >= 0)
+    if len(rows) == 0:
+        return
+    tags = tags[rows]
+    best = scores[rows].argmax(axis=1)
+    backpointers[rows, tags] = backpointers[rows, best]
+    best_scores = scores[rows, best]
+    scores[rows] = impossible_score(scores.dtype)
+    scores[rows, tags] = best_scores
+
+def viterbi_nbest(log_initial, log_transition, emission_rows, n, relabel=None):
+    '''
+    N-best (list) Viterbi decoding of a single sentence: every state keeps its n best partial paths instead of one.
+    input:  log_initial, log_transition, emission_rows, relabel: see viterbi_decode
+            n: number of paths
+    output: list of up to n (log10 score, list of tag ids) pairs, best first. The first path is the one viterbi_decode returns.
+    '''
+    sentence_length, no_of_tags = emission_rows.shape
+    if sentence_length == 0:
+        return [(0.0, [])]
+
+    # scores[tag, rank] is the rank-th best path ending in tag, and backpointers[index, tag, rank] the
+    # (tag_prev * n + rank_prev) it extends. Ties are broken towards the lowest tag_prev like viterbi_decode.
+    impossible = impossible_score(np.result_type(emission_rows, log_transition))
+    backpointers = np.zeros((sentence_length, no_of_tags, n), dtype=np.intp)
+    scores = np.full((no_of_tags, n), impossible)
+    scores[:, 0] = log_initial + emission_rows[0]
+    if relabel is not None and relabel[0] >= 0:
+        scores = _collapse_nbest(scores, backpointers[0], relabel[0])
+
+    for index in range(1, sentence_length):
+        candidates = (scores[:, :, None] + log_transition[:, None, :]).reshape(no_of_tags * n, no_of_tags)
+        order = np.argsort(-candidates, axis=0, kind='stable')[:n]
+        backpointers[index] = order.T
+        scores = np.take_along_axis(candidates, order, axis=0).T + emission_rows[index][:, None]
+        # the missing ranks are dead paths, kept at the impossible score so integer scores do not keep decreasing and overflow
+        scores[~_alive(scores)] = impossible
+        if relabel is not None and relabel[index] >= 0:
+            scores = _collapse_nbest(scores, backpointers[index], relabel[index])
+
+    # backtracking, one path per final (tag, rank)
+    flat_scores = scores.ravel()
+    ends = np.argsort(-flat_scores, kind='stable')[:n]
+    alive = _alive(flat_scores)
+    backpointers = backpointers.tolist()
+    paths = []
+    for end in ends.tolist():
+        if not alive[end]:
+            break
+        tag, rank = divmod(end, n)
+        path = [tag]
+        for index in range(sentence_length - 1, 0, -1):
+            tag, rank = divmod(backpointers[index][tag][rank], n)
+            path.append(tag)
+        path.reverse()
+        paths.append((float(flat_scores[end]), path))
+    return paths
+
+def _collapse_nbest(scores, backpointer_rows, tag):
+    # the n best paths over every state all end in tag. Paths extending the same previous path now tag the
+    # sentence identically, so only the best of them is kept and the n paths stay n distinct taggings.
+    order = np.argsort(-scores.ravel(), kind='stable')
+    extended = backpointer_rows.reshape(-1)[order]
+    _, first = np.unique(extended, return_index=True)
+    kept = np.sort(first)[:scores.shape[1]]
+    collapsed = np.full_like(scores, impossible_score(scores.dtype))
+    collapsed[tag, :len(kept)] = scores.ravel()[order[kept]]
+    backpointer_rows[tag, :len(kept)] = extended[kept]
+    return collapsed
+
+def forward_backward_batch(log_initial, log_transition, emission_rows, lengths, relabel=None):
+    '''
+    Forward-backward over a batch of sentences, in log10 space. The forward and backward scores of each position are
+    scaled by their largest value before the sums over the previous (or next) states, which are then matrix products
+    with the transition probabilities, so long sentences do not underflow.
+    input:  log_initial, log_transition, emission_rows, lengths, relabel: see viterbi_decode_batch, where a
+            relabeled position sums the paths of every state into its tag
+    output: posteriors      (batch_size, max_length, no_of_tags) P(tag|sentence) of each word, 0 past the end of each sentence
+            log_likelihoods (batch_size,) log10 P(sentence)
+    '''
+    batch_size, max_length, no_of_tags = emission_rows.shape
+    lengths = np.asarray(lengths)
+    active_counts = (lengths[None, :] > np.arange(max_length)[:, None]).sum(axis=1)
+    rows = np.arange(batch_size)
+    # transition probabilities scaled so the largest of each column (forward) or row (backward) is 1
+    forward_scale = log_transition.max(axis=0)
+    forward_transition = 10.0 ** (log_transition - forward_scale)
+    backward_scale = log_transition.max(axis=1)
+    backward_transition = (10.0 ** (log_transition - backward_scale[:, None])).T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # forward
+        alphas = np.full((batch_size, max_length, no_of_tags), -np.inf)
+        alphas[:, 0] = log_initial + emission_rows[:, 0]
+        if relabel is not None:
+            _collapse_sum_batch(alphas[:, 0], relabel[:, 0])
+        for index in range(1, max_length):
+            active = active_counts[index]
+            alphas[:active, index] = _log_matmul10(alphas[:active, index - 1], forward_transition, forward_scale) + emission_rows[:active, index]
+            if relabel is not None:
+                _collapse_sum_batch(alphas[:active, index], relabel[:active, index])
+        log_likelihoods = _logsumexp10(alphas[rows, lengths - 1], axis=1)
+
+        # backward
+        betas = np.full((batch_size, max_length, no_of_tags), -np.inf)
+        betas[rows, lengths - 1] = 0
+        for index in range(max_length - 2, -1, -1):
+            active = active_counts[index + 1]
+            next_betas = betas[:active, index + 1]
+            if relabel is not None:
+                # every state of a relabeled position continues as its tag
+                forced = np.flatnonzero(relabel[:active, index + 1] >= 0)
+                next_betas = next_betas.copy()
+                next_betas[forced] = next_betas[forced, relabel[forced, index + 1]][:, None]
+            betas[:active, index] = _log_matmul10(emission_rows[:active, index + 1] + next_betas, backward_transition, backward_scale)
+
+        posteriors = 10.0 ** (alphas + betas - log_likelihoods[:, None, None])
+    return np.nan_to_num(posteriors, nan=0.0), log_likelihoods
+
+def forward_backward(log_initial, log_transition, emission_rows, relabel=None):
+    '''
+    forward_backward_batch of a single sentence, returns its (sentence_length, no_of_tags) posteriors and log10 likelihood
+    '''
+    if len(emission_rows) == 0:
+        return np.zeros((0, len(log_initial))), 0.0
+    posteriors, log_likelihoods = forward_backward_batch(log_initial, log_transition, emission_rows[None], [len(emission_rows)],
+                                                         None if relabel is None else np.asarray(relabel)[None])
+    return posteriors[0], float(log_likelihoods[0])
+
+def _log_matmul10(scores, transition, transition_scale):
+    # log10 of (10 ** scores) @ (10 ** log_transition), with scores scaled by their largest value per sentence
+    peak = scores.max(axis=1, keepdims=True)
+    peak[~np.isfinite(peak)] = 0
+    return np.log10((10.0 ** (scores - peak)) @ transition) + peak + transition_scale
+
+def _logsumexp10(values, axis):
+    peak = values.max(axis=axis, keepdims=True)
+    peak[~np.isfinite(peak)] = 0
+    return np.log10((10.0 ** (values - peak)).sum(axis=axis)) + np.squeeze(peak, axis=axis)
+
+def _collapse_sum_batch(scores, tags):
+    rows = np.flatnonzero(tags >= 0)
+    if len(rows) == 0:
+        return
+    totals = _logsumexp10(scores[rows], axis=1)
+    scores[rows] = -np.inf
+    scores[rows, tags[rows]] = totals
+
+def _viterbi_step(scores, log_transition, emission_row, forced_tag, backpointer_row):
+    # one position of viterbi_decode, with the same arithmetic so every decoder built on it gives the same paths
+    candidates = scores[:, None] + log_transition
+    best_prev = candidates.argmax(axis=0)
+    backpointer_row[:] = best_prev
+    scores = emission_row + candidates[best_prev, np.arange(len(scores))]
+    if forced_tag >= 0:
+        scores = _collapse(scores, backpointer_row, forced_tag)
+    return scores
+
+class online_viterbi:
+    '''
+    Viterbi decoding of an unbounded stream of words, which emits the tags of a prefix of the stream as soon as
+    every path still alive agrees on it: once all the states with a finite score at the newest position descend
+    from the same state at an older position, no later word can change the best path up to there. Only the
+    backpointers of the positions which are not committed yet are kept. The tags are those viterbi_decode gives
+    for the whole stream as one sentence (scores are not rescaled, so the arithmetic is the same).
+        decoder = online_viterbi(log_initial, log_transition)
+        for emission_row in rows:
+            committed_tag_ids = decoder.push(emission_row)
+        committed_tag_ids = decoder.finish()
+    '''
+
+    def __init__(self, log_initial, log_transition):
+        self.log_initial = log_initial
+        self.log_transition = log_transition
+        self.no_of_tags = len(log_initial)
+        self.scores = None
+        self.backpointers = []      # backpointer rows of the uncommitted positions, oldest first
+        self.origins = None         # [tag] the state at the oldest uncommitted position of the best path ending in tag
+        self.position = 0           # number of words pushed
+        self.committed = 0          # number of words whose tags were emitted
+
+    def push(self, emission_row, forced_tag=-1):
+        '''
+        input:  (no_of_tags,) log P(word|tag) of the next word, and the tag id forced on it or -1, see viterbi_decode relabel
+        output: list of the tag ids committed by this word, possibly empty, for the words following the ones committed before
+        '''
+        backpointer_row = np.zeros(self.no_of_tags, dtype=np.intp)
+        if self.scores is None:
+            self.scores = self.log_initial + emission_row
+            if forced_tag >= 0:
+                self.scores = _collapse(self.scores, backpointer_row, forced_tag)
+        else:
+            self.scores = _viterbi_step(self.scores, self.log_transition, emission_row, forced_tag, backpointer_row)
+        self.backpointers.append(backpointer_row)
+        self.position += 1
+        self.origins = np.arange(self.no_of_tags) if self.origins is None else self.origins[backpointer_row]
+
+        alive = np.flatnonzero(_alive(self.scores))
+        if len(alive) == 0 or np.any(self.origins[alive] != self.origins[alive[0]]):
+            return []
+        # walk back from the alive states to the newest position where they all merge
+        ancestors = alive
+        merge_index = len(self.backpointers) - 1    # index in self.backpointers of the merge position
+        while len(np.unique(ancestors)) > 1:
+            ancestors = self.backpointers[merge_index][ancestors]
+            merge_index -= 1
+        return self.commit(merge_index, int(ancestors[0]))
+
+    def commit(self, merge_index, tag):
+        # emits the tags up to the merge position, which ends in tag, and forgets their backpointers
+        path = [tag]
+        for index in range(merge_index, 0, -1):
+            path.append(int(self.backpointers[index][path[-1]]))
+        path.reverse()
+
+        remaining = self.backpointers[merge_index + 1:]
+        if remaining:
+            # states of the new oldest uncommitted position on the best path to every current state
+            origins = np.arange(self.no_of_tags)
+            for backpointer_row in reversed(remaining[1:]):
+                origins = backpointer_row[origins]
+            self.origins = origins
+        else:
+            self.origins = None
+        self.backpointers = remaining
+        self.committed += len(path)
+        return path
+
+    def finish(self):
+        '''
+        Ends the stream, output: list of the tag ids of the words not committed yet
+        '''
+        if not self.backpointers:
+            return []
+        path = self.commit(len(self.backpointers) - 1, int(self.scores.argmax()))
+        self.scores = None
+        return path
+
+def viterbi_decode_checkpointed(log_initial, log_transition, emission_segment, sentence_length, relabel=None, checkpoint_interval=None):
+    '''
+    Viterbi decoding of a very long sentence with O(sqrt(sentence_length)) memory: the forward pass keeps only the scores
+    of every checkpoint_interval-th position, and the backtrace recomputes the backpointers of one segment between
+    two checkpoints at a time, from the last segment to the first. Gives the same tags as viterbi_decode.
+    input:  log_initial, log_transition: see viterbi_decode
+            emission_segment: function (start, end) -> (end - start, no_of_tags) emission rows of the words start to end
+            sentence_length: number of words
+            relabel: optional (sentence_length,) tag ids, see viterbi_decode
+            checkpoint_interval: number of positions between checkpoints, sqrt(sentence_length) by default
+    output: list of the best tag ids, one per word
+    '''
+    if sentence_length == 0:
+        return []
+    if checkpoint_interval is None:
+        checkpoint_interval = max(1, int(np.sqrt(sentence_length)))
+    no_of_tags = len(log_initial)
+    forced_tags = np.full(sentence_length, -1, dtype=np.intp) if relabel is None else np.asarray(relabel)
+    backpointer_row = np.zeros(no_of_tags, dtype=np.intp)
+
+    def forward(scores, start, end, backpointers=None):
+        # scores at position start -> scores at position end - 1, with the backpointers of start + 1 to end - 1
+        rows = emission_segment(start + 1, end)
+        for offset, index in enumerate(range(start + 1, end)):
+            row = backpointers[offset] if backpointers is not None else backpointer_row
+            scores = _viterbi_step(scores, log_transition, rows[offset], forced_tags[index], row)
+        return scores
+
+    scores = log_initial + emission_segment(0, 1)[0]
+    if forced_tags[0] >= 0:
+        scores = _collapse(scores, backpointer_row, forced_tags[0])
+    checkpoints = [scores]     # scores at positions 0, checkpoint_interval, 2 * checkpoint_interval, ...
+    for start in range(0, sentence_length - 1, checkpoint_interval):
+        end = min(start + checkpoint_interval, sentence_length - 1)
+        scores = forward(scores, start, end + 1)
+        if end % checkpoint_interval == 0:
+            checkpoints.append(scores)
+
+    # backtrace, one segment at a time
+    path = [int(scores.argmax())]
+    for segment in range((sentence_length - 1) // checkpoint_interval, -1, -1):
+        start = segment * checkpoint_interval
+        end = min(start + checkpoint_interval, sentence_length - 1)
+        if end == start:
+            continue
+        backpointers = np.zeros((end - start, no_of_tags), dtype=np.intp)
+        forward(checkpoints[segment], start, end + 1, backpointers)
+        for offset in range(end - start - 1, -1, -1):
+            path.append(int(backpointers[offset][path[-1]]))
+    path.reverse()
+    return path
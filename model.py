@@ -0,0 +1,599 @@
+import collections
+import contextlib
+import copy
+import json
+import math
+import os
+
+import numpy as np
+
+from cache import lru_cache
+from counts import training_counts, bucket_word
+from decoder import impossible_score, trellis_workspace, viterbi_decode, viterbi_decode_batch, viterbi_nbest, forward_backward_batch, online_viterbi, viterbi_decode_checkpointed
+from parallel import tag_parallel, count_parallel
+
+class hmm_model:
+    '''
+    Hidden Markov Model POS tagger which is trained once and can then tag any number of test batches.
+        model = hmm_model(k=0.00001, hapax=True).fit(train)
+        predicts = model.tag(test)
+    k:      Laplace smoothing constant
+    hapax:  scale the emission smoothing constant of each tag by P(tag|word_occurs_once)
+    beam_width, beam_threshold: optional beam pruning of the trellis, see decoder.viterbi_decode, None for exact decoding
+    emission_cache_size: number of word ids whose trellis emission rows are kept in an LRU cache, 0 or None to gather them from the tables every time
+    sentence_cache_size: number of tagged sentences kept in an LRU cache, so repeated sentences are not decoded again, 0 or None for no cache
+    instruments: optional profiler.instrumentation which times the training and decoding phases and counts tokens, unknown words
+                 and trellis states. Only the work done in this process is recorded, not that of tag(workers > 1) worker processes.
+    max_words, min_word_count, hash_buckets: optional vocabulary policy bounding the size of the tables, see counts.training_counts.restrict.
+                 Only the max_words most frequent training words and/or those seen at least min_word_count times keep their own
+                 emissions. The other words share hash_buckets hashed bucket emissions, which unseen words hashed to a used
+                 bucket also get, or are unknown words if hash_buckets is 0.
+    keep_counts: keep the training_counts after fitting, which update() needs. They hold a dense vocabulary x tags count matrix,
+                 several times the size of the tables, so they are dropped by default.
+    '''
+
+    def __init__(self, k=0.00001, hapax=True, beam_width=None, beam_threshold=None, emission_cache_size=None, sentence_cache_size=None, instruments=None,
+                 max_words=None, min_word_count=None, hash_buckets=0, keep_counts=False):
+        if beam_width is not None and beam_width < 1:
+            raise ValueError('beam_width must be at least 1, not {}'.format(beam_width))
+        self.k = k
+        self.hapax = hapax
+        self.beam_width = beam_width
+        self.beam_threshold = beam_threshold
+        self.emission_cache = lru_cache(emission_cache_size) if emission_cache_size else None
+        self.sentence_cache = lru_cache(sentence_cache_size) if sentence_cache_size else None
+        self.version = 0        # incremented whenever the tables change, part of the sentence cache keys
+        self.path = None        # directory of the saved model the tables are memory-mapped from, if any
+        self.instruments = instruments
+        self.workspace = trellis_workspace()    # trellis buffers reused by every batch this model decodes, one set per thread
+        self.scale = None       # fixed-point scale of the score tables of a quantized model, None for float log10 tables
+        self.max_words = max_words
+        self.min_word_count = min_word_count
+        self.hash_buckets = hash_buckets
+        self.keep_counts = keep_counts
+        self.counts = None      # training_counts, only kept after fitting with keep_counts
+
+    def fit(self, train, workers=1):
+        '''
+        input:  training data (iterable of sentences, with tags on the words), may be a generator
+                E.g. [[(word1, tag1), (word2, tag2)], [(word3, tag3), (word4, tag4)]]
+                workers: number of processes the sentences are split across for counting, their counts are then merged
+        output: the trained model itself
+        '''
+        with self.phase('counting'):
+            if workers > 1:
+                train = list(train)
+                shard_size = max(1, -(-len(train) // workers))
+                counts = count_parallel([train[start:start + shard_size] for start in range(0, len(train), shard_size)], workers)
+            else:
+                counts = training_counts().add(train)
+        return self.fit_counts(counts)
+
+    def fit_counts(self, counts):
+        '''
+        Builds the log probability tables from already collected training_counts
+        '''
+        with self.phase('probabilities'):
+            if not self.restricts_vocabulary:
+                return self.build_tables(counts)
+            self.build_tables(counts.restrict(self.max_words, self.min_word_count, self.hash_buckets))
+            # the full counts are the ones kept, update() adds to them and restricts them again
+            self.counts = counts if self.keep_counts else None
+            return self
+
+    @property
+    def restricts_vocabulary(self):
+        return self.max_words is not None or self.min_word_count is not None or self.hash_buckets > 0
+
+    def build_tables(self, counts):
+        k = self.k
+
+        vocab_size = len(counts.word_index)         # Number of unique words in the training set
+        no_of_tags = len(counts.tag_index) + 1      # Number of tags in the training set, + 1 to account for 'UNKNOWN-TAG'
+        word_tag_counts = counts.word_tag_counts
+        temp_tag_counter = counts.tag_transition_counts.sum(axis=1)    # number of times a tag is followed by another tag
+
+        # =================================================================================================================================================================
+        # Probability Calulations #
+
+        # P(word|tag) = (count(word,tag)+k)/(count(tag)+k∗|vocab_size+1|), with k scaled by the hapax probability of the tag
+        smoothing, emission_denominators = self.emission_smoothing(counts)
+        seen_words, seen_tags = np.nonzero(word_tag_counts)
+        seen_emission_probabilities = (word_tag_counts[seen_words, seen_tags] + smoothing[seen_tags]) / emission_denominators[seen_tags]
+        unknown_emission_probabilities = smoothing / emission_denominators   # Numerator will be k for 'UNKNOWN'
+
+        # P(tag_curr|tag_prev) = (count(tag_prev−>tag_curr)+k) / (count(tag_prev)+k∗|no._of_tags|)
+        transition_probabilities = (counts.tag_transition_counts + k) / (temp_tag_counter + k * no_of_tags)[:, None]
+
+        # P(tag_i|starting_position) = (count(tag_i,starting_position)+k) / (Σj∈|num_tags|count(tagj_starting_position)+k∗|no_of_tags|)
+        initial_probabilities = (counts.tag_initial_counts + k) / (counts.sentence_count + k * no_of_tags)
+
+        # =================================================================================================================================================================
+        # Log Tables #
+        # log10 tables indexed by integer tag/word ids, used by the vectorized decoder. Emissions are stored sparsely:
+        # the (word, tag) pairs seen in training in CSR arrays (the tags of word id w are emission_tags[emission_indptr[w]:emission_indptr[w + 1]]),
+        # and one fallback value per tag for every unseen pair, which is also the emission of 'UNKNOWN-WORD'.
+
+        self.counts = counts if self.keep_counts else None
+        self.tags = counts.tags
+        self.tag_index = dict(counts.tag_index)
+        self.word_index = counts.word_index
+        self.unknown_word_id = vocab_size
+
+        self.log_initial = _log10(initial_probabilities)
+        self.log_transition = _log10(transition_probabilities)
+        self.emission_indptr = np.concatenate(([0], np.cumsum(np.bincount(seen_words, minlength=vocab_size))))
+        self.emission_tags = seen_tags.astype(np.int16)
+        self.emission_log = _log10(seen_emission_probabilities)
+        self.emission_fallback = _log10(unknown_emission_probabilities)
+        self.smoothing = smoothing
+        self.emission_denominators = emission_denominators
+        self.tables_changed()
+        return self
+
+    def emission_smoothing(self, counts):
+        '''
+        Per tag smoothing constant of the emissions, and emission denominator count(tag)+k∗|vocab_size+1|
+        '''
+        k = self.k
+        vocab_size = len(counts.word_index)
+        no_of_tags = len(counts.tag_index) + 1
+
+        # P(tag|word_occurs_once) = (count(word_occurs_once,tag)+k) / (count(word_occurs_once)+k∗|no_of_tags|)
+        if self.hapax:
+            hapax_counts = counts.hapax_counts
+            hapax_probabilities = (hapax_counts + k) / (int(hapax_counts.sum()) + k * no_of_tags)
+        else:
+            hapax_probabilities = np.ones(no_of_tags - 1)
+
+        smoothing = k * hapax_probabilities
+        return smoothing, counts.tag_counts + smoothing * abs(vocab_size + 1)
+
+    def update(self, sentences):
+        '''
+        Adds labeled sentences (same format as the training data) to the trained model without retraining it.
+        Only the counts of the new sentences are added, and only the log probabilities which depend on them are
+        recomputed: the transitions out of their tags, the emissions of their words, and the emissions of the tags
+        whose hapax smoothing term or total count changed. A new word, tag or (word, tag) pair changes the
+        vocabulary size or the sparse emission layout, and rebuilds the tables from the counts instead.
+        '''
+        if self.scale is not None:
+            raise ValueError('a quantized model can not be updated, update the float model and quantize it again')
+        if self.counts is None:
+            if self.path is not None:
+                raise ValueError('the model loaded from {} has no training counts to update'.format(self.path))
+            raise ValueError('the model has no training counts to update, fit it with keep_counts=True')
+        k = self.k
+        counts = self.counts
+        sentences = [list(sentence) for sentence in sentences]
+        old_shape = (len(counts.word_index), len(counts.tag_index))
+        counts.add(sentences)
+        # a restricted vocabulary may gain or lose words with any new count
+        if (len(counts.word_index), len(counts.tag_index)) != old_shape or self.restricts_vocabulary:
+            return self.fit_counts(counts)
+
+        touched_words = np.unique([counts.word_index[word] for sentence in sentences for word, tag in sentence]).astype(np.intp)
+        if not np.array_equal(np.count_nonzero(counts.word_tag_counts[touched_words], axis=1), np.diff(self.emission_indptr)[touched_words]):
+            return self.fit_counts(counts)
+        no_of_tags = len(counts.tag_index) + 1
+
+        # emissions
+        smoothing, emission_denominators = self.emission_smoothing(counts)
+        changed_tags = (smoothing != self.smoothing) | (emission_denominators != self.emission_denominators)
+        entry_words = np.repeat(np.arange(len(counts.word_index)), np.diff(self.emission_indptr))
+        entries = np.flatnonzero(changed_tags[self.emission_tags] | np.isin(entry_words, touched_words))
+        words, tags = entry_words[entries], self.emission_tags[entries]
+        self.emission_log[entries] = _log10((counts.word_tag_counts[words, tags] + smoothing[tags]) / emission_denominators[tags])
+        self.emission_fallback = _log10(smoothing / emission_denominators)
+        self.smoothing = smoothing
+        self.emission_denominators = emission_denominators
+
+        # transitions out of the tags followed by another tag in the new sentences
+        previous_tags = np.unique([counts.tag_index[tag] for sentence in sentences for word, tag in sentence[:-1]]).astype(np.intp)
+        if len(previous_tags) > 0:
+            rows = counts.tag_transition_counts[previous_tags]
+            self.log_transition[previous_tags] = _log10((rows + k) / (rows.sum(axis=1) + k * no_of_tags)[:, None])
+
+        # initial probabilities, their denominator is the number of sentences
+        self.log_initial = _log10((counts.tag_initial_counts + k) / (counts.sentence_count + k * no_of_tags))
+
+        self.tables_changed()
+        return self
+
+    def quantize(self, scale=1000, dtype=None):
+        '''
+        Fixed-point copy of the trained model: every log10 score is multiplied by scale and rounded to an integer, and
+        stored as int16 if all of them fit, int32 otherwise (or as dtype). Its trellis is computed in integer arithmetic,
+        with int64 path scores. Tags can only differ from the float model's where two paths score within about
+        sentence_length / scale (log10) of each other. beam_threshold is scaled too. A quantized model can tag, but not
+        be updated or compute tag_marginals.
+        '''
+        if self.scale is not None:
+            raise ValueError('the model is already quantized')
+        tables = {name: np.round(np.asarray(getattr(self, name), dtype=np.float64) * scale) for name in _SCORE_TABLES}
+        low = min(table.min() for table in tables.values())
+        high = max(table.max() for table in tables.values())
+        if dtype is None:
+            dtype = np.int16 if np.iinfo(np.int16).min <= low and high <= np.iinfo(np.int16).max else np.int32
+        if low < np.iinfo(dtype).min or high > np.iinfo(dtype).max:
+            raise ValueError('the scores scaled by {} range from {} to {}, which does not fit {}'.format(scale, low, high, np.dtype(dtype).name))
+
+        model = copy.copy(self)
+        model.scale = scale
+        for name, table in tables.items():
+            setattr(model, name, table.astype(dtype))
+        model.counts = None
+        model.word_index = dict(self.word_index)
+        model.path = None
+        if self.beam_threshold is not None:
+            model.beam_threshold = self.beam_threshold * scale
+        model.emission_cache = lru_cache(self.emission_cache.maxsize) if self.emission_cache is not None else None
+        model.sentence_cache = lru_cache(self.sentence_cache.maxsize) if self.sentence_cache is not None else None
+        model.workspace = trellis_workspace()
+        model.tables_changed()
+        return model
+
+    @property
+    def score_dtype(self):
+        # dtype of the trellis scores, integer for a quantized model
+        return np.float64 if self.scale is None else np.int64
+
+    def table_bytes(self):
+        '''
+        Number of bytes of the score and emission tables
+        '''
+        return sum(np.asarray(getattr(self, name)).nbytes for name in _TABLES)
+
+    def phase(self, name):
+        '''
+        Context manager timing a phase in the instruments, if any
+        '''
+        if self.instruments is None:
+            return contextlib.nullcontext()
+        return self.instruments.phase(name)
+
+    def tables_changed(self):
+        # results computed from the old tables are stale
+        if self.emission_cache is not None:
+            self.emission_cache.clear()
+        self.version += 1
+
+    def log_emission(self, word, tag):
+        '''
+        log P(word|tag), smoothed for pairs not seen in training
+        '''
+        word_id = self.word_id(word)
+        tag_id = self.tag_index[tag]
+        if word_id != self.unknown_word_id:
+            start, end = self.emission_indptr[word_id], self.emission_indptr[word_id + 1]
+            position = np.flatnonzero(self.emission_tags[start:end] == tag_id)
+            if len(position) > 0:
+                return float(self.emission_log[start + position[0]])
+        return float(self.emission_fallback[tag_id])
+
+    def word_id(self, word):
+        '''
+        Id of a word: its own, that of its hashed bucket if the vocabulary is restricted to hash_buckets, or unknown_word_id
+        '''
+        word_id = self.word_index.get(word)
+        if word_id is None:
+            if self.hash_buckets > 0:
+                return self.word_index.get(bucket_word(word, self.hash_buckets), self.unknown_word_id)
+            return self.unknown_word_id
+        return word_id
+
+    def emission_rows(self, word_ids):
+        '''
+        Trellis emission scores of an array of word ids, with one extra trailing axis over the tags:
+        the seen tags of a known word get their log emission and every other tag -inf, since the trellis
+        only expands the tags seen with a known word; 'UNKNOWN-WORD' expands to every tag.
+        '''
+        word_ids = np.asarray(word_ids, dtype=np.intp)
+        flat_ids = word_ids.ravel()
+        rows = np.full((len(flat_ids), len(self.tags)), impossible_score(self.score_dtype), dtype=self.score_dtype)
+
+        known = flat_ids != self.unknown_word_id
+        positions = np.flatnonzero(known)
+        starts = self.emission_indptr[flat_ids[positions]]
+        lengths = self.emission_indptr[flat_ids[positions] + 1] - starts
+        # gather the CSR entries of every known position in one go
+        entry_positions = np.repeat(positions, lengths)
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        rows[entry_positions, self.emission_tags[entries]] = self.emission_log[entries]
+        rows[~known] = self.emission_fallback
+        return rows.reshape(word_ids.shape + (len(self.tags),))
+
+    def save(self, path):
+        '''
+        Saves the trained model to the directory path:
+            model.json                  model class, smoothing, beam, quantization and vocabulary parameters and tags in tag id order
+            words.txt                   vocabulary, one word per line in word id order, then the used hashed buckets
+            log_initial.npy             (no_of_tags,) float64, or int16/int32 for a quantized model, like the other score tables
+            log_transition.npy          (no_of_tags, no_of_tags) float64
+            emission_indptr.npy         (vocab_size + 1,) int64, CSR row pointers of the seen (word, tag) pairs
+            emission_tags.npy           (seen pairs,) int16 tag ids
+            emission_log.npy            (seen pairs,) float64
+            emission_fallback.npy       (no_of_tags,) float64, emission of unseen pairs and 'UNKNOWN-WORD'
+        '''
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'model.json'), 'w', encoding='UTF-8') as f:
+            json.dump({'model': type(self).__name__, 'k': self.k, 'hapax': self.hapax, 'beam_width': self.beam_width, 'beam_threshold': self.beam_threshold,
+                       'scale': self.scale, 'max_words': self.max_words, 'min_word_count': self.min_word_count, 'hash_buckets': self.hash_buckets,
+                       'tags': self.tags}, f)
+        with open(os.path.join(path, 'words.txt'), 'w', encoding='UTF-8') as f:
+            for word in self.word_index:
+                f.write(word + '\n')
+        for name in _TABLES:
+            np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Loads a model saved with save(). The tables are memory-mapped read-only, so every process
+        loading the same directory shares a single physical copy of them.
+        '''
+        with open(os.path.join(path, 'model.json'), 'r', encoding='UTF-8') as f:
+            header = json.load(f)
+        if header['model'] != cls.__name__:
+            raise ValueError('{} holds a {}, not a {}'.format(path, header['model'], cls.__name__))
+
+        model = cls(k=header['k'], hapax=header['hapax'], beam_width=header.get('beam_width'), beam_threshold=header.get('beam_threshold'),
+                    max_words=header.get('max_words'), min_word_count=header.get('min_word_count'), hash_buckets=header.get('hash_buckets', 0))
+        model.path = path
+        model.counts = None
+        model.scale = header.get('scale')
+        model.tags = header['tags']
+        model.tag_index = {tag: i for i, tag in enumerate(model.tags)}
+        with open(os.path.join(path, 'words.txt'), 'r', encoding='UTF-8') as f:
+            model.word_index = {line.rstrip('\n'): i for i, line in enumerate(f)}
+        model.unknown_word_id = len(model.word_index)
+        for name in _TABLES:
+            setattr(model, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+        return model
+
+    def __getstate__(self):
+        # a memory-mapped model is sent to other processes as its path, so they map the same files instead of copying the tables
+        if self.path is not None:
+            return {'path': self.path}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if 'path' in state and len(state) == 1:
+            state = type(self).load(state['path']).__dict__
+        self.__dict__.update(state)
+
+    def unknown_word_tag(self, word, index):
+        '''
+        Tag forced on an unseen word at position index of its sentence, or None to let the trellis pick it
+        '''
+        return None
+
+    def postprocess(self, sentence):
+        '''
+        Hook applied to every tagged sentence after backtracking
+        '''
+        return sentence
+
+    def tag(self, test, batch_size=256, workers=1):
+        '''
+        input:  test data (list of sentences, no tags on the words)
+                E.g [[word1,word2...]]
+                batch_size: number of sentences of similar length decoded together, 0 or None to decode one sentence at a time
+                workers: number of processes the test sentences are split across
+        output: list of sentences with tags on the words
+                E.g. [[(word1, tag1), (word2, tag2)...], [(word1, tag1), (word2, tag2)...]...]
+        '''
+        if workers > 1:
+            return tag_parallel(self, test, workers, batch_size=batch_size)
+        if self.sentence_cache is None:
+            tagged_sentences = self.decode(test, batch_size)
+            with self.phase('postprocess'):
+                return [self.postprocess(tagged_sentence) for tagged_sentence in tagged_sentences]
+
+        predicts = [None] * len(test)
+        misses = dict()     # key -> indexes in test of the sentences which are not cached, each distinct sentence is decoded once
+        for index, sentence in enumerate(test):
+            key = (self.version, tuple(sentence))
+            tags = self.sentence_cache.get(key)
+            if tags is None:
+                misses.setdefault(key, []).append(index)
+            else:
+                predicts[index] = self.postprocess(list(zip(sentence, tags)))
+
+        keys = list(misses)
+        for key, tagged_sentence in zip(keys, self.decode([list(key[1]) for key in keys], batch_size)):
+            self.sentence_cache.put(key, tuple(tag for word, tag in tagged_sentence))
+            for index in misses[key]:
+                predicts[index] = self.postprocess(list(zip(test[index], (tag for word, tag in tagged_sentence))))
+        return predicts
+
+    def decode(self, test, batch_size=256):
+        '''
+        Tagged sentences, as tag but before postprocess
+        '''
+        if not batch_size:
+            return [self.tag_sentence(sentence) for sentence in test]
+
+        predicts = [[] for sentence in test]
+        # length bucketing, so that little of each batch is padding
+        order = sorted((index for index, sentence in enumerate(test) if len(sentence) > 0), key=lambda index: len(test[index]), reverse=True)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            for index, tagged_sentence in zip(bucket, self.tag_batch([test[index] for index in bucket])):
+                predicts[index] = tagged_sentence
+        return predicts
+
+    def tag_stream(self, sentences, chunk_size=4096, batch_size=256):
+        '''
+        Generator version of tag for a stream of sentences of any length, tags chunk_size sentences
+        at a time and yields the tagged sentences in order, so memory use does not grow with the input
+        '''
+        chunk = []
+        for sentence in sentences:
+            chunk.append(sentence)
+            if len(chunk) == chunk_size:
+                yield from self.tag(chunk, batch_size=batch_size)
+                chunk = []
+        if chunk:
+            yield from self.tag(chunk, batch_size=batch_size)
+
+    def tag_online(self, words):
+        '''
+        Generator tagging an unbounded stream of words as one sentence, with no sentence breaks needed: yields (word, tag)
+        pairs as soon as every path still alive agrees on them, see decoder.online_viterbi. Yields the same tags as tag()
+        on the whole stream, with memory bounded by the longest stretch of words which are not committed.
+        '''
+        decoder = online_viterbi(self.log_initial, self.log_transition)
+        pending = collections.deque()   # words whose tags are not committed yet
+        for index, word in enumerate(words):
+            word_id = self.word_id(word)
+            forced_tag = self.unknown_word_tag(word, index) if word_id == self.unknown_word_id else None
+            pending.append(word)
+            committed = decoder.push(self.emission_rows([word_id])[0], -1 if forced_tag is None else self.tag_index[forced_tag])
+            if committed:
+                yield from self.postprocess([(pending.popleft(), self.tags[tag_id]) for tag_id in committed])
+        committed = decoder.finish()
+        if committed:
+            yield from self.postprocess([(pending.popleft(), self.tags[tag_id]) for tag_id in committed])
+
+    def tag_long(self, sentence, checkpoint_interval=None):
+        '''
+        Tags one very long sentence with the checkpointed decoder, which keeps about 2 * sqrt(len(sentence)) rows of scores
+        and backpointers instead of one row per word, see decoder.viterbi_decode_checkpointed. Gives the same tags as tag().
+        '''
+        word_ids, relabel = self.encode(sentence)
+        word_ids = np.array(word_ids, dtype=np.intp)
+        path = viterbi_decode_checkpointed(self.log_initial, self.log_transition, lambda start, end: self.emission_rows(word_ids[start:end]),
+                                           len(sentence), relabel, checkpoint_interval)
+        return self.postprocess([(word, self.tags[tag_id]) for word, tag_id in zip(sentence, path)])
+
+    def encode(self, sentence):
+        '''
+        Word ids of a sentence, and the tag ids forced on its unseen words (-1 where none), or None if there are none
+        '''
+        word_ids = [self.word_index.get(word, self.unknown_word_id) for word in sentence]
+        if self.hash_buckets > 0:
+            word_ids = [self.word_id(word) if word_id == self.unknown_word_id else word_id for word, word_id in zip(sentence, word_ids)]
+        relabel = None
+        for index, word_id in enumerate(word_ids):
+            if word_id == self.unknown_word_id:
+                forced_tag = self.unknown_word_tag(sentence[index], index)
+                if forced_tag is not None:
+                    if relabel is None:
+                        relabel = [-1] * len(sentence)
+                    relabel[index] = self.tag_index[forced_tag]
+        return word_ids, relabel
+
+    def cached_emission_rows(self, word_ids):
+        '''
+        emission_rows() through the emission cache, keyed by word id: every distinct word id of the batch is looked up
+        once, and only the rows missing from the cache are gathered from the tables
+        '''
+        word_ids = np.asarray(word_ids, dtype=np.intp)
+        unique_ids, inverse = np.unique(word_ids.ravel(), return_inverse=True)
+        rows = np.empty((len(unique_ids), len(self.tags)), dtype=self.score_dtype)
+        missing = []
+        for position, word_id in enumerate(unique_ids.tolist()):
+            row = self.emission_cache.get(word_id)
+            if row is None:
+                missing.append(position)
+            else:
+                rows[position] = row
+        if missing:
+            rows[missing] = self.emission_rows(unique_ids[missing])
+            for position in missing:
+                self.emission_cache.put(int(unique_ids[position]), rows[position].copy())
+        return rows[inverse.ravel()].reshape(word_ids.shape + (len(self.tags),))
+
+    def tag_sentence(self, sentence):
+        emission_rows, relabel = self.trellis_inputs([sentence])
+        path = viterbi_decode(self.log_initial, self.log_transition, emission_rows[0], None if relabel is None else relabel[0], self.beam_width, self.beam_threshold, self.instruments, self.workspace)
+        return [(word, self.tags[tag_id]) for word, tag_id in zip(sentence, path)]
+
+    def tag_batch(self, sentences):
+        '''
+        Tags non-empty sentences sorted by decreasing length in one batched trellis
+        '''
+        emission_rows, relabel = self.trellis_inputs(sentences)
+        lengths = [len(sentence) for sentence in sentences]
+        paths = viterbi_decode_batch(self.log_initial, self.log_transition, emission_rows, lengths, relabel, self.beam_width, self.beam_threshold, self.instruments, self.workspace)
+        return [[(word, self.tags[tag_id]) for word, tag_id in zip(sentence, path)] for sentence, path in zip(sentences, paths)]
+
+    def trellis_inputs(self, sentences):
+        '''
+        (batch_size, max_length, no_of_tags) emission rows of a batch of sentences, padded with 'UNKNOWN-WORD', and the
+        (batch_size, max_length) tag ids forced on their unseen words (-1 where none), or None if there are none
+        '''
+        with self.phase('emissions'):
+            word_ids, relabel = self.encode_batch(sentences)
+            emission_rows = self.emission_rows(word_ids) if self.emission_cache is None else self.cached_emission_rows(word_ids)
+        if self.instruments is not None:
+            lengths = np.array([len(sentence) for sentence in sentences])
+            # words given the 'UNKNOWN-WORD' row, not those of a restricted vocabulary's hashed buckets
+            unknown = (word_ids == self.unknown_word_id) & (np.arange(word_ids.shape[1]) < lengths[:, None])
+            self.instruments.count('sentences', len(sentences))
+            self.instruments.count('tokens', int(lengths.sum()))
+            self.instruments.count('unknown_words', int(unknown.sum()))
+        return emission_rows, relabel
+
+    def encode_batch(self, sentences):
+        '''
+        (batch_size, max_length) word ids of a batch of sentences, padded with unknown_word_id, and the tag ids forced
+        on their unseen words, see trellis_inputs
+        '''
+        max_length = max(len(sentence) for sentence in sentences)
+        word_ids = np.full((len(sentences), max_length), self.unknown_word_id, dtype=np.intp)
+        relabel = None
+        for row, sentence in enumerate(sentences):
+            sentence_word_ids, sentence_relabel = self.encode(sentence)
+            word_ids[row, :len(sentence)] = sentence_word_ids
+            if sentence_relabel is not None:
+                if relabel is None:
+                    relabel = np.full((len(sentences), max_length), -1, dtype=np.intp)
+                relabel[row, :len(sentence)] = sentence_relabel
+        return word_ids, relabel
+
+    def tag_nbest(self, test, n):
+        '''
+        input:  test data (list of sentences, no tags on the words)
+                n: number of taggings of each sentence
+        output: list with, for each sentence, a list of up to n (log10 P(sentence, tags), tagged sentence) pairs, best first
+        '''
+        predicts = []
+        for sentence in test:
+            if len(sentence) == 0:
+                predicts.append([(0.0, [])])
+                continue
+            emission_rows, relabel = self.trellis_inputs([sentence])
+            paths = viterbi_nbest(self.log_initial, self.log_transition, emission_rows[0], n, None if relabel is None else relabel[0])
+            if self.scale is not None:
+                paths = [(score / self.scale, path) for score, path in paths]
+            predicts.append([(score, self.postprocess([(word, self.tags[tag_id]) for word, tag_id in zip(sentence, path)])) for score, path in paths])
+        return predicts
+
+    def tag_marginals(self, test, batch_size=256):
+        '''
+        Posterior probability of every tag of every word given its sentence, by forward-backward
+        input:  test data (list of sentences, no tags on the words)
+                batch_size: number of sentences of similar length computed together
+        output: list with, for each sentence, a (sentence_length, no_of_tags) array of P(tag|sentence), columns in self.tags order
+        '''
+        if self.scale is not None:
+            raise ValueError('tag marginals need the float model, not a quantized one')
+        predicts = [np.zeros((0, len(self.tags))) for sentence in test]
+        order = sorted((index for index, sentence in enumerate(test) if len(sentence) > 0), key=lambda index: len(test[index]), reverse=True)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            sentences = [test[index] for index in bucket]
+            emission_rows, relabel = self.trellis_inputs(sentences)
+            posteriors, _ = forward_backward_batch(self.log_initial, self.log_transition, emission_rows, [len(sentence) for sentence in sentences], relabel)
+            for index, sentence, sentence_posteriors in zip(bucket, sentences, posteriors):
+                predicts[index] = sentence_posteriors[:len(sentence)]
+        return predicts
+
+_TABLES = ('log_initial', 'log_transition', 'emission_indptr', 'emission_tags', 'emission_log', 'emission_fallback')
+_SCORE_TABLES = ('log_initial', 'log_transition', 'emission_log', 'emission_fallback')
+
+def _log10(values):
+    # math.log10 rather than np.log10, whose last bit differs for some values and would change tie-breaking in the trellis
+    return np.array([math.log10(value) for value in values.ravel().tolist()]).reshape(values.shape)
@@ -1,8 +1,11 @@
 import argparse
+import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from viterbi import viterbi_p1, viterbi_p2, baseline
-from extra import extra
+from extra import extra, extra_model
+from profiler import instrumentation
 import utils
 
 """
@@ -10,28 +13,90 @@ This file contains the main application that is run for this MP.
 """
 
 
+def check_threads(model, test, predictions, threads, chunk_size=16):
+    """
+    Tags test in chunks from threads threads sharing model at the same time, and returns the number of chunks
+    tagged differently from predictions, which should be 0
+    """
+    chunks = [test[start:start + chunk_size] for start in range(0, len(test), chunk_size)]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        tagged_chunks = list(executor.map(lambda chunk: model.tag(chunk, batch_size=chunk_size), chunks))
+    return sum(tagged_chunk != predictions[start:start + chunk_size]
+               for start, tagged_chunk in zip(range(0, len(test), chunk_size), tagged_chunks))
+
+
 def main(args):
     print("Loading dataset...")
-    train_set = utils.load_dataset(args.training_file)
-    test_set = utils.load_dataset(args.test_file)
+    train_set = utils.load_dataset(args.training_file, cache=True)
+    test_set = utils.load_dataset(args.test_file, cache=True)
     print("Loaded dataset")
     print()
 
+    if args.model_dir != None:
+        extra_model().fit(train_set).save(args.model_dir)
+        print("Saved extra model to {}".format(args.model_dir))
+        print()
+
+    test_evaluator = utils.evaluator(train_set, test_set)
+    reports = {}
+
     # for algorithm, name in zip([baseline, viterbi_p1, viterbi_p2, extra], ['Baseline', 'Viterbi_p1', 'Viterbi_p2', 'extra']):
     for algorithm, name in zip([extra], ['extra']):
         print("Running {}...".format(name))
-        testtag_predictions = algorithm(train_set, utils.strip_tags(test_set))
-        baseline_acc, correct_wordtagcounter, wrong_wordtagcounter = utils.evaluate_accuracies(test_set,
-                                                                                               testtag_predictions)
-        multitags_acc, unseen_acc, = utils.specialword_accuracies(train_set, test_set, testtag_predictions)
+        if algorithm is baseline:
+            testtag_predictions = algorithm(train_set, utils.strip_tags(test_set))
+        elif args.report_file != None or args.profile != None:
+            instruments = instrumentation(profile=args.profile)
+            with instruments.profiling():
+                testtag_predictions = algorithm(train_set, utils.strip_tags(test_set), workers=args.workers, instruments=instruments)
+            reports[name] = instruments.report()
+            print("\tPhases: {}".format(', '.join('{} {:.3f}s'.format(phase, entry['seconds']) for phase, entry in reports[name]['phases'].items())))
+            if reports[name]['profile'] != None:
+                print("\tTop functions:")
+                for entry in reports[name]['profile'][:args.profile_top]:
+                    if 'total_seconds' in entry:
+                        print("\t\t{:8.3f}s {:>9} calls  {}".format(entry['total_seconds'], entry['calls'], entry['function']))
+                    else:
+                        print("\t\t{:7.1f}% {:>9} samples  {}".format(entry['fraction'] * 100, entry['samples'], entry['function']))
+        else:
+            testtag_predictions = algorithm(train_set, utils.strip_tags(test_set), workers=args.workers)
+        # the per-token evaluate_accuracies only runs once, for the top-k counters
+        _, correct_wordtagcounter, wrong_wordtagcounter = utils.evaluate_accuracies(test_set, testtag_predictions)
+        results = test_evaluator.evaluate(testtag_predictions)
+        baseline_acc, multitags_acc, unseen_acc = results['accuracy'], results['multitag_accuracy'], results['unseen_accuracy']
+        predicted_tag_ids = test_evaluator.encode(testtag_predictions)
 
         print("Accuracy: {:.2f}%".format(baseline_acc * 100))
         print("\tTop K Wrong Word-Tag Predictions: {}".format(utils.topk_wordtagcounter(wrong_wordtagcounter, k=4)))
         print("\tTop K Correct Word-Tag Predictions: {}".format(utils.topk_wordtagcounter(correct_wordtagcounter, k=4)))
         print("\tMultitags Accuracy: {:.2f}%".format(multitags_acc * 100))
         print("\tUnseen words Accuracy: {:.2f}%".format(unseen_acc * 100))
+
+        if algorithm is not baseline and (args.beam_width != None or args.beam_threshold != None):
+            beam_predictions = algorithm(train_set, utils.strip_tags(test_set), workers=args.workers,
+                                         beam_width=args.beam_width, beam_threshold=args.beam_threshold)
+            beam_acc = test_evaluator.evaluate(beam_predictions)['accuracy']
+            agreement = (test_evaluator.encode(beam_predictions) == predicted_tag_ids).mean()
+            print("\tBeam Accuracy: {:.2f}% ({:+.2f}% from exact decoding, {:.2f}% of tags agree with it)".format(
+                beam_acc * 100, (beam_acc - baseline_acc) * 100, agreement * 100))
+
+        if algorithm is not baseline and args.quantize_scale != None:
+            quantized_predictions = algorithm(train_set, utils.strip_tags(test_set), workers=args.workers, quantize_scale=args.quantize_scale)
+            quantized_acc = test_evaluator.evaluate(quantized_predictions)['accuracy']
+            agreement = (test_evaluator.encode(quantized_predictions) == predicted_tag_ids).mean()
+            print("\tQuantized Accuracy: {:.2f}% ({:+.4f}% from float scores, {:.3f}% of tags agree with them)".format(
+                quantized_acc * 100, (quantized_acc - baseline_acc) * 100, agreement * 100))
+
+        if algorithm is extra and args.threads != None:
+            wrong_chunks = check_threads(extra_model().fit(train_set), utils.strip_tags(test_set), testtag_predictions, args.threads)
+            print("\tThreaded tagging: {} chunks tagged differently from {} threads".format(wrong_chunks, args.threads))
         print()
 
+    if args.report_file != None:
+        with open(args.report_file, 'w', encoding='UTF-8') as f:
+            json.dump(reports, f, indent=2)
+        print("Wrote instrumentation report to {}".format(args.report_file))
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='CS440 MP4 HMM')
@@ -39,8 +104,28 @@ if __name__ == "__main__":
                         help='the file of the training data')
     parser.add_argument('--test', dest='test_file', type=str,
                         help='the file of the testing data')
+    parser.add_argument('--workers', dest='workers', type=int, default=1,
+                        help='the number of processes used for tagging')
+    parser.add_argument('--beam-width', dest='beam_width', type=int,
+                        help='also decode keeping only this many states per word, and compare with exact decoding')
+    parser.add_argument('--beam-threshold', dest='beam_threshold', type=float,
+                        help='also decode keeping only states within this log10 score of the best, and compare with exact decoding')
+    parser.add_argument('--quantize', dest='quantize_scale', type=float,
+                        help='also decode with fixed-point scores, log10 probabilities times this scale rounded to integers, and compare with float scores')
+    parser.add_argument('--threads', dest='threads', type=int,
+                        help='also tag the test set from this many threads sharing one trained model, and check it is tagged the same')
+    parser.add_argument('--save-model', dest='model_dir', type=str,
+                        help='the directory to save the trained extra model to')
+    parser.add_argument('--instrument', dest='report_file', type=str,
+                        help='time the training and decoding phases, count tokens, unknown words and trellis states, and write them to this JSON file')
+    parser.add_argument('--profile', dest='profile', choices=['cprofile', 'sample'],
+                        help='also profile each algorithm, with cProfile or a sampling profiler, print its top functions and add them to the --instrument report')
+    parser.add_argument('--profile-top', dest='profile_top', type=int, default=10,
+                        help='the number of top functions of --profile printed')
     args = parser.parse_args()
     if args.training_file == None or args.test_file == None:
         sys.exit('You must specify training file and testing file!')
+    if args.beam_width != None and args.beam_width < 1:
+        parser.error('--beam-width must be at least 1')
 
     main(args)
@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from counts import training_counts
+import utils
+
+_worker_state = None
+
+def _init_worker(state):
+    # runs once in every worker process, so the state (e.g. the trained tables) is shipped once per worker rather than once per task
+    global _worker_state
+    _worker_state = state
+
+def worker_state():
+    '''
+    State of the worker_pool the calling process is a worker of
+    '''
+    return _worker_state
+
+def worker_pool(state, workers):
+    '''
+    Process pool whose workers each hold a copy of state, which the tasks they run get from worker_state().
+    worker_pool(model, workers) runs tag_chunk.
+    '''
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,))
+
+def map_workers(function, items, state, workers):
+    '''
+    list(map(function, items)) in a worker_pool of state, or in this process with the same worker_state() if workers <= 1
+    '''
+    if workers <= 1:
+        _init_worker(state)
+        return list(map(function, items))
+    with worker_pool(state, workers) as executor:
+        return list(executor.map(function, items))
+
+def tag_chunk(chunk, batch_size=256):
+    '''
+    Tags a list of sentences with the model of the worker process it runs in
+    '''
+    return worker_state().tag(chunk, batch_size=batch_size)
+
+def tag_parallel(model, test, workers, chunk_size=None, batch_size=256):
+    '''
+    Tags test sentences with a trained model in a pool of worker processes.
+    input:  model: trained hmm_model (or any model with a tag(test, batch_size) method)
+            test data (list of sentences, no tags on the words)
+            workers: number of worker processes
+            chunk_size: number of sentences sent to a worker at a time, by default each worker gets about 4 chunks
+    output: list of sentences with tags on the words, in the same order as test
+    '''
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(test) // (workers * 4)))
+    chunks = [test[start:start + chunk_size] for start in range(0, len(test), chunk_size)]
+
+    predicts = []
+    with worker_pool(model, workers) as executor:
+        for tagged_chunk in executor.map(tag_chunk, chunks, [batch_size] * len(chunks)):
+            predicts.extend(tagged_chunk)
+    return predicts
+
+def count_shard(shard):
+    '''
+    training_counts of one shard, a list of training sentences or the path of a data file
+    '''
+    if isinstance(shard, str):
+        shard = utils.iter_dataset(shard)
+    return training_counts().add(shard)
+
+def count_parallel(shards, workers):
+    '''
+    Counts the shards of a training corpus in a pool of worker processes, and merges their counts in shard order,
+    so the result is the same as counting the shards one after the other in one process.
+    input:  shards: list of shards, each a list of training sentences or the path of a data file, which the worker reads itself
+            workers: number of worker processes
+    output: merged training_counts
+    '''
+    counts = training_counts()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard_counts in executor.map(count_shard, shards):
+            counts.merge(shard_counts)
+    return counts
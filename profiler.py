@@ -0,0 +1,128 @@
+import cProfile
+import collections
+import contextlib
+import pstats
+import sys
+import threading
+import time
+
+class instrumentation:
+    '''
+    Phase timers and counters of training and decoding, and an optional profiler of a whole run, exported as one report.
+    Models and decoders take it as an optional instruments argument, and only time and count when they are given one.
+        instruments = instrumentation(profile='cprofile')
+        with instruments.profiling():
+            model = hmm_model(instruments=instruments).fit(train)
+            predicts = model.tag(test)
+        report = instruments.report()
+    profile:            None, 'cprofile' (deterministic, every call) or 'sample' (periodic samples of the running function, lower overhead)
+    sample_interval:    seconds between two samples of the 'sample' profiler
+    '''
+
+    def __init__(self, profile=None, sample_interval=0.001):
+        if profile not in (None, 'cprofile', 'sample'):
+            raise ValueError('unknown profiler {}'.format(profile))
+        self.profile = profile
+        self.sample_interval = sample_interval
+        self.phase_seconds = collections.Counter()
+        self.phase_calls = collections.Counter()
+        self.counters = collections.Counter()
+        self.profile_entries = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.phase_seconds[name] += seconds
+        self.phase_calls[name] += 1
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    @contextlib.contextmanager
+    def profiling(self, top=20):
+        '''
+        Runs the profiler chosen at construction, if any, over the body of the with statement
+        '''
+        if self.profile == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self.profile_entries = _cprofile_entries(profiler, top)
+        elif self.profile == 'sample':
+            sampler = _sampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                self.profile_entries = sampler.entries(top)
+        else:
+            yield
+
+    def report(self):
+        '''
+        output: dict of the time and number of calls of every phase, the counters, a few rates derived
+                from them, and the top functions of the profiler if one was run
+        '''
+        counters = self.counters
+        derived = {}
+        decode_seconds = sum(self.phase_seconds[name] for name in ('emissions', 'trellis', 'backtracking'))
+        if counters['tokens'] > 0:
+            derived['unknown_word_rate'] = counters['unknown_words'] / counters['tokens']
+            if decode_seconds > 0:
+                derived['decode_tokens_per_second'] = counters['tokens'] / decode_seconds
+        if counters['trellis_steps'] > 0:
+            derived['states_expanded_per_step'] = counters['states_expanded'] / counters['trellis_steps']
+        return {
+            'phases': {name: {'seconds': self.phase_seconds[name], 'calls': self.phase_calls[name]} for name in self.phase_seconds},
+            'counters': dict(counters),
+            'derived': derived,
+            'profile': self.profile_entries,
+        }
+
+def _cprofile_entries(profiler, top):
+    stats = pstats.Stats(profiler).stats
+    entries = []
+    for (filename, line, function), (primitive_calls, calls, total, cumulative, callers) in stats.items():
+        entries.append({'function': '{}:{}({})'.format(filename, line, function), 'calls': calls,
+                        'total_seconds': total, 'cumulative_seconds': cumulative})
+    entries.sort(key=lambda entry: entry['total_seconds'], reverse=True)
+    return entries[:top]
+
+class _sampler:
+    # background thread which records the innermost function of another thread every interval seconds
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                code = frame.f_code
+                self.samples['{}:{}({})'.format(code.co_filename, code.co_firstlineno, code.co_name)] += 1
+
+    def entries(self, top):
+        no_of_samples = sum(self.samples.values())
+        return [{'function': function, 'samples': samples, 'fraction': samples / no_of_samples}
+                for function, samples in self.samples.most_common(top)]
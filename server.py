@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from parallel import worker_pool, tag_chunk
+from tag import load_model
+import utils
+
+"""
+Tagging server for a model saved by mp4.py --save-model. The model is loaded once, and the sentences
+of all connected clients are gathered into micro-batches which are tagged together.
+Line protocol: every request line is one sentence of whitespace separated words, and is answered by one
+line of word=TAG pairs. A client may send many lines without waiting, the answers come back in order.
+The request line #metrics is answered by one line of JSON metrics. A line which is not valid UTF-8, or longer than
+the line limit, is answered by a line starting with #error, and the connection goes on.
+"""
+
+class tagging_server:
+    '''
+    Asyncio server which tags the sentences of concurrent clients in micro-batches: a batch is sent to
+    the decoder as soon as it holds max_batch_size sentences, or max_wait seconds after its first one arrived.
+        server = tagging_server(model, max_batch_size=64, max_wait=0.002, workers=2)
+        host, port = await server.start('127.0.0.1', 8440)
+        ...
+        await server.stop()
+    workers:        number of worker processes decoding batches, each with its own copy of the model;
+                    1 decodes in a thread of this process, so the event loop keeps serving while it runs
+    latency_window: number of most recent requests the latency percentiles are computed over
+    max_pending:    number of requests of one connection which may wait for their replies, the next line is only read
+                    once the oldest reply is sent, so a client sending faster than it reads is slowed down
+    line_limit:     number of bytes of the longest request line
+    '''
+
+    def __init__(self, model, max_batch_size=64, max_wait=0.002, workers=1, latency_window=10000, max_pending=1024, line_limit=1 << 16):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self.max_pending = max_pending
+        self.line_limit = line_limit
+        self.latencies = collections.deque(maxlen=latency_window)     # seconds from arrival to reply of recent requests
+        self.queue_waits = collections.deque(maxlen=latency_window)    # seconds from arrival to the start of decoding
+        self.requests = 0
+        self.batches = 0
+        self.batched_sentences = 0
+        self.max_queue_depth = 0
+        self.decode_seconds = 0
+        self.queue = None
+        self.connections = dict()   # handler task -> stream writer of every open connection
+
+    async def start(self, host, port):
+        '''
+        Starts serving on host:port (port 0 picks a free port), and returns the (host, port) it listens on
+        '''
+        self.queue = asyncio.Queue()
+        self.executor = worker_pool(self.model, self.workers) if self.workers > 1 else ThreadPoolExecutor(max_workers=1)
+        self.free_workers = asyncio.Semaphore(max(1, self.workers))
+        self.batcher = asyncio.ensure_future(self.collect_batches())
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=self.line_limit)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        # the connections still open are closed, and their handlers finish replying before the batcher stops
+        self.server.close()
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        self.executor.shutdown()
+
+    async def tag(self, sentence):
+        '''
+        Tags one sentence (list of words) in the next batch
+        '''
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((sentence, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # a batch only starts once a worker is free to decode it, sentences arriving meanwhile join it
+            await self.free_workers.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.ensure_future(self.run_batch(batch))
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        sentences = [sentence for sentence, future, arrival in batch]
+        try:
+            start = time.perf_counter()
+            for sentence, future, arrival in batch:
+                self.queue_waits.append(start - arrival)
+            if self.workers > 1:
+                tagged_sentences = await loop.run_in_executor(self.executor, tag_chunk, sentences)
+            else:
+                tagged_sentences = await loop.run_in_executor(self.executor, self.model.tag, sentences)
+            end = time.perf_counter()
+            self.decode_seconds += end - start
+            self.batches += 1
+            self.batched_sentences += len(batch)
+            for (sentence, future, arrival), tagged_sentence in zip(batch, tagged_sentences):
+                self.latencies.append(end - arrival)
+                if not future.done():
+                    future.set_result(tagged_sentence)
+        except Exception as error:
+            for sentence, future, arrival in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self.free_workers.release()
+
+    async def respond(self, line):
+        # line: bytes of a request line, or None for a line longer than the limit
+        if line is None:
+            return '#error line longer than {} bytes'.format(self.line_limit)
+        try:
+            line = line.decode('UTF-8')
+        except UnicodeDecodeError:
+            return '#error line is not valid UTF-8'
+        if line.strip() == '#metrics':
+            return json.dumps(self.metrics())
+        words = line.split()
+        self.requests += 1
+        # the model only knows lowercased words, the reply keeps the words as they were sent
+        tagged_sentence = await self.tag([word.lower() for word in words])
+        return ' '.join('{}={}'.format(word, tag) for word, (_, tag) in zip(words, tagged_sentence))
+
+    async def handle_connection(self, reader, writer):
+        replies = asyncio.Queue(maxsize=self.max_pending)   # replies of this connection in request order, None after the last one
+
+        async def write_replies():
+            # keeps taking the replies after the client is gone, so reading never waits on a full queue for nothing
+            connected = True
+            while True:
+                reply = await replies.get()
+                if reply is None:
+                    break
+                try:
+                    text = await reply
+                except Exception as error:
+                    text = '#error {}'.format(error)
+                if connected:
+                    try:
+                        writer.write((text + '\n').encode('UTF-8'))
+                        await writer.drain()
+                    except ConnectionError:
+                        connected = False
+
+        replier = asyncio.ensure_future(write_replies())
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await read_request(reader)
+                if line == b'':
+                    break
+                await replies.put(asyncio.ensure_future(self.respond(line)))
+            await replies.put(None)
+            await replier
+        except ConnectionError:
+            pass
+        finally:
+            replier.cancel()
+            del self.connections[asyncio.current_task()]
+            writer.close()
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        queue_waits = np.array(self.queue_waits) * 1000
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_sentences / self.batches if self.batches > 0 else 0,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'decode_seconds': self.decode_seconds,
+            'latency_ms': {'p50': _percentile(latencies, 50), 'p90': _percentile(latencies, 90), 'p99': _percentile(latencies, 99)},
+            'queue_wait_ms': {'p50': _percentile(queue_waits, 50), 'p99': _percentile(queue_waits, 99)},
+        }
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) > 0 else None
+
+async def read_request(reader):
+    '''
+    Next line of a stream reader, b'' at its end, or None for a line longer than the reader's limit, which is skipped
+    '''
+    try:
+        return await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+    except asyncio.LimitOverrunError as error:
+        consumed = error.consumed
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b'\n')
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as error:
+            consumed = error.consumed
+
+
+async def request_lines(host, port, lines):
+    '''
+    Loopback client: sends the lines over one connection without waiting for the replies, and returns the replies
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    for line in lines:
+        writer.write((line + '\n').encode('UTF-8'))
+    await writer.drain()
+    replies = [(await reader.readline()).decode('UTF-8').rstrip('\n') for line in lines]
+    writer.close()
+    await writer.wait_closed()
+    return replies
+
+
+async def check(server, test_file, no_of_clients):
+    '''
+    Serves on a free loopback port, tags test_file through no_of_clients concurrent clients and
+    compares the replies with tagging it offline. Returns the number of wrong replies.
+    '''
+    lines = [' '.join(sentence) for sentence in utils.strip_tags(utils.load_dataset(test_file))]
+    expected = [' '.join('{}={}'.format(word, tag) for word, tag in tagged_sentence)
+                for tagged_sentence in server.model.tag([line.split() for line in lines])]
+
+    host, port = await server.start('127.0.0.1', 0)
+    start = time.perf_counter()
+    chunk_size = -(-len(lines) // no_of_clients)
+    chunks = [lines[start:start + chunk_size] for start in range(0, len(lines), chunk_size)]
+    replies = [reply for chunk_replies in await asyncio.gather(*(request_lines(host, port, chunk) for chunk in chunks))
+               for reply in chunk_replies]
+    seconds = time.perf_counter() - start
+    metrics = json.loads((await request_lines(host, port, ['#metrics']))[0])
+    await server.stop()
+
+    wrong = sum(reply != expected_reply for reply, expected_reply in zip(replies, expected))
+    print("{} sentences from {} clients in {:.2f}s, {} replies differ from offline tagging".format(len(lines), len(chunks), seconds, wrong))
+    print(json.dumps(metrics, indent=2))
+    return wrong
+
+
+def main(args):
+    model = load_model(args.model_dir)
+    server = tagging_server(model, max_batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000, workers=args.workers,
+                            max_pending=args.max_pending)
+    if args.check_file != None:
+        if asyncio.run(check(server, args.check_file, args.clients)) > 0:
+            sys.exit(1)
+        return
+
+    async def serve():
+        host, port = await server.start(args.host, args.port)
+        print("Serving {} on {}:{}".format(args.model_dir, host, port), file=sys.stderr)
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP4 HMM tagging server')
+    parser.add_argument('--model', dest='model_dir', type=str,
+                        help='the directory of the saved model')
+    parser.add_argument('--host', dest='host', type=str, default='127.0.0.1',
+                        help='the address to listen on')
+    parser.add_argument('--port', dest='port', type=int, default=8440,
+                        help='the port to listen on')
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=64,
+                        help='the largest number of sentences tagged in one batch')
+    parser.add_argument('--max-wait-ms', dest='max_wait_ms', type=float, default=2,
+                        help='the longest time a sentence waits for its batch to fill up')
+    parser.add_argument('--workers', dest='workers', type=int, default=1,
+                        help='the number of processes decoding batches')
+    parser.add_argument('--max-pending', dest='max_pending', type=int, default=1024,
+                        help='the largest number of requests of one connection waiting for their replies')
+    parser.add_argument('--check', dest='check_file', type=str,
+                        help='instead of serving, tag this tagged data file through local loopback clients and compare with offline tagging')
+    parser.add_argument('--clients', dest='clients', type=int, default=8,
+                        help='the number of concurrent loopback clients of --check')
+    args = parser.parse_args()
+    if args.model_dir == None:
+        sys.exit('You must specify a model directory!')
+
+    main(args)
@@ -0,0 +1,126 @@
+import argparse
+import json
+import sys
+import time
+
+from counts import training_counts
+from model import hmm_model
+from extra import extra_model
+from parallel import map_workers, worker_state
+import utils
+
+"""
+Sweep of the smoothing constant k and the vocabulary policy of the taggers. The training counts are collected
+once and shared by every setting, only the probability tables are rebuilt for each setting, and the settings are
+decoded on the development set in a pool of worker processes.
+"""
+
+models = {
+    'hmm_model': hmm_model,
+    'extra_model': extra_model,
+}
+
+def run_setting(setting):
+    # the counts and the test set are shipped once per worker rather than once per setting
+    model_class, counts, test, test_evaluator = worker_state()
+    start = time.perf_counter()
+    model = model_class(**setting).fit_counts(counts)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = model.tag(test)
+    decode_seconds = time.perf_counter() - start
+
+    results = test_evaluator.evaluate(predictions)
+    return dict(setting, **{
+        'vocabulary_size': len(model.word_index),
+        'table_bytes': model.table_bytes(),
+        'accuracy': float(results['accuracy']),
+        'multitag_accuracy': float(results['multitag_accuracy']),
+        'unseen_accuracy': float(results['unseen_accuracy']),
+        'fit_seconds': fit_seconds,
+        'decode_seconds': decode_seconds,
+    })
+
+def sweep(model_class, counts, train_set, test_set, settings, workers=1):
+    '''
+    input:  model_class: hmm_model or a subclass, constructed as model_class(**setting)
+            counts: training_counts of train_set
+            train_set, test_set: training and development data, with tags on the words
+            settings: list of dicts of model parameters, e.g. {'k': 1e-5, 'hapax': True, 'max_words': 10000}
+            workers: number of worker processes
+    output: list of result dicts, one per setting in the same order
+    '''
+    state = (model_class, counts, utils.strip_tags(test_set), utils.evaluator(train_set, test_set))
+    return map_workers(run_setting, settings, state, workers)
+
+def vocabulary_policy(setting):
+    parts = []
+    if setting['max_words'] != None:
+        parts.append('top{}'.format(setting['max_words']))
+    if setting['min_word_count'] != None:
+        parts.append('min{}'.format(setting['min_word_count']))
+    if setting['hash_buckets'] > 0:
+        parts.append('hash{}'.format(setting['hash_buckets']))
+    return '+'.join(parts) if parts else 'all'
+
+
+def main(args):
+    train_set = utils.load_dataset(args.training_file, cache=True)
+    test_set = utils.load_dataset(args.test_file, cache=True)
+
+    start = time.perf_counter()
+    counts = training_counts().add(train_set)
+    count_seconds = time.perf_counter() - start
+    print("Counted {} training sentences in {:.2f}s".format(counts.sentence_count, count_seconds), file=sys.stderr)
+
+    hapaxes = {'on': [True], 'off': [False], 'both': [False, True]}[args.hapax]
+    # 0 means no limit
+    settings = [{'k': k, 'hapax': hapax, 'max_words': max_words or None, 'min_word_count': min_count or None, 'hash_buckets': hash_buckets}
+                for k in args.ks for hapax in hapaxes
+                for max_words in args.max_words for min_count in args.min_counts for hash_buckets in args.hash_buckets]
+    start = time.perf_counter()
+    results = sweep(models[args.model], counts, train_set, test_set, settings, args.workers)
+    sweep_seconds = time.perf_counter() - start
+
+    print("{:>10} {:>6} {:>22} {:>8} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8}".format(
+        'k', 'hapax', 'vocabulary', 'words', 'tables', 'accuracy', 'multitag', 'unseen', 'fit(s)', 'tag(s)'))
+    for entry in results:
+        print("{:>10.0e} {:>6} {:>22} {:>8} {:>7.0f}kB {:>8.2f}% {:>8.2f}% {:>8.2f}% {:>8.3f} {:>8.3f}".format(
+            entry['k'], 'on' if entry['hapax'] else 'off', vocabulary_policy(entry), entry['vocabulary_size'], entry['table_bytes'] / 1024,
+            entry['accuracy'] * 100, entry['multitag_accuracy'] * 100, entry['unseen_accuracy'] * 100, entry['fit_seconds'], entry['decode_seconds']))
+    best = max(results, key=lambda entry: entry['accuracy'])
+    print("Best: k={:g} hapax={} vocabulary {} accuracy {:.2f}% ({} settings in {:.2f}s)".format(
+        best['k'], 'on' if best['hapax'] else 'off', vocabulary_policy(best), best['accuracy'] * 100, len(results), sweep_seconds))
+
+    if args.output_file != None:
+        with open(args.output_file, 'w', encoding='UTF-8') as f:
+            json.dump({'model': args.model, 'training_file': args.training_file, 'test_file': args.test_file,
+                       'count_seconds': count_seconds, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP4 HMM smoothing sweep')
+    parser.add_argument('--train', dest='training_file', type=str, default='data/masc-training.txt',
+                        help='the file of the training data')
+    parser.add_argument('--test', dest='test_file', type=str, default='data/masc-dev.txt',
+                        help='the file of the development data')
+    parser.add_argument('--model', dest='model', choices=list(models), default='hmm_model',
+                        help='the tagger whose smoothing constant is swept')
+    parser.add_argument('--k', dest='ks', type=float, nargs='+', default=[1, 1e-1, 1e-2, 1e-3, 1e-4, 1e-5, 1e-10, 1e-30, 1e-70],
+                        help='the smoothing constants to try')
+    parser.add_argument('--hapax', dest='hapax', choices=['on', 'off', 'both'], default='both',
+                        help='whether the emission smoothing is scaled by the hapax tag probabilities')
+    parser.add_argument('--max-words', dest='max_words', type=int, nargs='+', default=[0],
+                        help='the vocabulary sizes to try, only the most frequent training words keep their own emissions, 0 for all of them')
+    parser.add_argument('--min-count', dest='min_counts', type=int, nargs='+', default=[0],
+                        help='the least number of times a training word must occur to keep its own emissions, 0 for no cutoff')
+    parser.add_argument('--hash-buckets', dest='hash_buckets', type=int, nargs='+', default=[0],
+                        help='the numbers of hashed buckets sharing the emissions of the other words, 0 to make them unknown words')
+    parser.add_argument('--workers', dest='workers', type=int, default=1,
+                        help='the number of processes decoding settings at the same time')
+    parser.add_argument('--output', dest='output_file', type=str,
+                        help='optional file to write the JSON results to')
+    args = parser.parse_args()
+
+    main(args)
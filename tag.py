@@ -0,0 +1,64 @@
+import argparse
+from collections import deque
+import sys
+
+from model import hmm_model
+from extra import extra_model
+
+"""
+Tags raw text with a model saved by mp4.py --save-model, streaming it line by line.
+Each input line is one sentence of whitespace separated words, each output line is the
+same sentence as word=TAG pairs.
+"""
+
+models = {'hmm_model': hmm_model, 'extra_model': extra_model}
+
+
+def load_model(model_dir):
+    for model_class in models.values():
+        try:
+            return model_class.load(model_dir)
+        except ValueError:
+            continue
+    sys.exit('{} is not a saved model of a known class!'.format(model_dir))
+
+
+def tag_lines(model, lines, chunk_size=4096):
+    sentences = (line.split() for line in lines)
+    words = deque()     # the original words of the sentences waiting in the current chunk, the model only sees them lowercased
+
+    def lowercased(sentences):
+        for sentence in sentences:
+            words.append(sentence)
+            yield [word.lower() for word in sentence]
+
+    for tagged_sentence in model.tag_stream(lowercased(sentences), chunk_size=chunk_size):
+        sentence = words.popleft()
+        yield ' '.join('{}={}'.format(word, tag) for word, (_, tag) in zip(sentence, tagged_sentence))
+
+
+def main(args):
+    model = load_model(args.model_dir)
+    if args.input_file == None or args.input_file == '-':
+        lines = sys.stdin
+    else:
+        lines = open(args.input_file, 'r', encoding='UTF-8')
+
+    with lines:
+        for tagged_line in tag_lines(model, lines, chunk_size=args.chunk_size):
+            sys.stdout.write(tagged_line + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CS440 MP4 HMM streaming tagger')
+    parser.add_argument('--model', dest='model_dir', type=str,
+                        help='the directory of the saved model')
+    parser.add_argument('--input', dest='input_file', type=str,
+                        help='the file of raw sentences to tag, stdin if omitted')
+    parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=4096,
+                        help='the number of sentences tagged at a time')
+    args = parser.parse_args()
+    if args.model_dir == None:
+        sys.exit('You must specify a model directory!')
+
+    main(args)
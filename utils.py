@@ -1,4 +1,7 @@
 import collections
+import os
+
+import numpy as np
 
 tagset = {'NOUN', 'VERB', 'ADJ', 'ADV',
           'PRON', 'DET', 'IN', 'NUM',
@@ -73,14 +76,73 @@ def specialword_accuracies(train_sentences, predicted_sentences, tag_sentences):
     return multitag_accuracy, unseen_accuracy
 
 
+class evaluator:
+    """
+    Evaluates predictions against one tagged test set with array operations. The gold tags, the test words'
+    training statistics (unseen, has multiple tags) and their masks are computed once, so evaluating each new
+    set of predictions only encodes the predicted tags.
+        ev = evaluator(train_sentences, tag_sentences)
+        results = ev.evaluate(predicted_sentences)
+    """
+
+    def __init__(self, train_sentences, tag_sentences):
+        seen_words, words_with_multitags_set = get_word_tag_statistics(train_sentences)
+        self.tags = sorted(tagset | {tag for sentence in tag_sentences for word, tag in sentence})
+        self.tag_ids = {tag: i for i, tag in enumerate(self.tags)}
+        self.sentence_lengths = [len(sentence) for sentence in tag_sentences]
+
+        words = [word for sentence in tag_sentences for word, tag in sentence]
+        self.gold = np.array([self.tag_ids[tag] for sentence in tag_sentences for word, tag in sentence], dtype=np.intp)
+        self.multitag_mask = np.array([word in words_with_multitags_set for word in words], dtype=bool)
+        self.unseen_mask = np.array([word not in seen_words for word in words], dtype=bool)
+
+    def encode(self, predicted_sentences):
+        assert [len(sentence) for sentence in predicted_sentences] == self.sentence_lengths
+        tag_ids = self.tag_ids
+        for sentence in predicted_sentences:
+            for pair in sentence:
+                if pair[1] not in tag_ids:
+                    tag_ids[pair[1]] = len(self.tags)
+                    self.tags.append(pair[1])
+        return np.array([tag_ids[pair[1]] for sentence in predicted_sentences for pair in sentence], dtype=np.intp)
+
+    def evaluate(self, predicted_sentences):
+        """
+        :param predicted_sentences:
+        :return: dict of the accuracy, the accuracy on words with multiple tags, the accuracy on words that do not
+                 occur in the training sentences, and the confusion matrix indexed [gold tag id, predicted tag id] of the tags in self.tags
+        """
+        predicted = self.encode(predicted_sentences)
+        correct = predicted == self.gold
+        no_of_tags = len(self.tags)
+        return {
+            'accuracy': correct.mean() if len(correct) > 0 else 0,
+            'multitag_accuracy': correct[self.multitag_mask].mean() if self.multitag_mask.any() else 0,
+            'unseen_accuracy': correct[self.unseen_mask].mean() if self.unseen_mask.any() else 0,
+            'confusion': np.bincount(self.gold * no_of_tags + predicted, minlength=no_of_tags * no_of_tags).reshape(no_of_tags, no_of_tags),
+        }
+
+
 def topk_wordtagcounter(wordtagcounter, k):
     top_items = sorted(wordtagcounter.items(), key=lambda item: sum(item[1].values()), reverse=True)[:k]
     top_items = list(map(lambda item: (item[0], dict(item[1])), top_items))
     return top_items
 
 
-def load_dataset(data_file):
-    sentences = []
+def load_dataset(data_file, cache=False):
+    """
+    :param data_file:
+    :param cache: if True, read the sentences from the binary cache next to data_file (see tagged_corpus), writing it first if needed
+    :return: list of sentences, each a list of (word, tag) pairs
+    """
+    if cache:
+        return tagged_corpus.load(data_file).sentences()
+    return list(iter_dataset(data_file))
+
+def iter_dataset(data_file):
+    '''
+    Generator version of load_dataset, yields one sentence at a time so the whole file never has to be in memory
+    '''
     if data_file=='cleaner-data/pentree-training.txt' or data_file=='cleaner-data/pentree-test.txt':
         tagsets=hidden_tagset
     else:
@@ -105,8 +167,105 @@ def load_dataset(data_file):
                     for element in splitted[1:-1]:
                         word += '/' + element
                     sentence.append((word.lower(), tag))
-            sentences.append(sentence)
-    return sentences
+            yield sentence
+
+class tagged_corpus:
+    """
+    Tagged sentences stored compactly: every word and tag is interned once, and the sentences are two arrays of
+    word ids and tag ids, split by an array of sentence start offsets. load() keeps a binary copy of these arrays
+    next to the text file, keyed by the file's modification time and size, so the text is only parsed again after
+    the file changes.
+        corpus = tagged_corpus.load('data/brown-dev.txt')
+        sentences = corpus.sentences()
+    """
+
+    cache_suffix = '.cache.npz'
+    cache_format = 1    # bump when the parsing in iter_dataset changes, to invalidate existing caches
+
+    def __init__(self, words, tags, offsets, word_ids, tag_ids):
+        self.words = words          # word id -> word
+        self.tags = tags            # tag id -> tag
+        self.offsets = offsets      # (no_of_sentences + 1,) sentence i is tokens offsets[i]:offsets[i+1]
+        self.word_ids = word_ids    # (no_of_tokens,)
+        self.tag_ids = tag_ids      # (no_of_tokens,)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return [(self.words[word_id], self.tags[tag_id])
+                for word_id, tag_id in zip(self.word_ids[start:end].tolist(), self.tag_ids[start:end].tolist())]
+
+    def sentences(self):
+        """
+        :return: list of sentences, each a list of (word, tag) pairs, as returned by load_dataset. Every distinct
+                 (word, tag) pair is a single shared tuple.
+        """
+        pair_keys = self.word_ids.astype(np.int64) * len(self.tags) + self.tag_ids
+        unique_keys, pair_ids = np.unique(pair_keys, return_inverse=True)
+        words, tags = self.words, self.tags
+        pairs = [(words[key // len(tags)], tags[key % len(tags)]) for key in unique_keys.tolist()]
+        tokens = list(map(pairs.__getitem__, pair_ids.tolist()))
+        offsets = self.offsets.tolist()
+        return [tokens[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @classmethod
+    def from_sentences(cls, sentences):
+        word_index = dict()
+        tag_index = dict()
+        offsets = [0]
+        word_ids = []
+        tag_ids = []
+        for sentence in sentences:
+            for word, tag in sentence:
+                word_ids.append(word_index.setdefault(word, len(word_index)))
+                tag_ids.append(tag_index.setdefault(tag, len(tag_index)))
+            offsets.append(len(word_ids))
+        return cls(list(word_index), list(tag_index), np.array(offsets, dtype=np.int64),
+                   np.array(word_ids, dtype=np.int32), np.array(tag_ids, dtype=np.int16))
+
+    @classmethod
+    def load(cls, data_file):
+        """
+        :param data_file: text file of word=TAG sentences, one per line
+        :return: the tagged_corpus of data_file, from its cache file if that is up to date
+        """
+        cache_file = data_file + cls.cache_suffix
+        stat = os.stat(data_file)
+        key = np.array([cls.cache_format, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+        try:
+            with np.load(cache_file) as cached:
+                if np.array_equal(cached['key'], key):
+                    return cls(_split_strings(cached['words']), _split_strings(cached['tags']),
+                               cached['offsets'], cached['word_ids'], cached['tag_ids'])
+        except (OSError, KeyError, ValueError):
+            pass
+
+        corpus = cls.from_sentences(iter_dataset(data_file))
+        corpus.save(cache_file, key)
+        return corpus
+
+    def save(self, cache_file, key):
+        # written to a temporary file first, so a concurrent reader never sees a partial cache
+        temporary_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        try:
+            with open(temporary_file, 'wb') as f:
+                np.savez(f, key=key, words=_join_strings(self.words), tags=_join_strings(self.tags),
+                         offsets=self.offsets, word_ids=self.word_ids, tag_ids=self.tag_ids)
+            os.replace(temporary_file, cache_file)
+        except OSError:
+            # a read-only data directory only costs the cache
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+
+def _join_strings(strings):
+    # words never contain whitespace, so a newline after each one is an unambiguous separator
+    return np.frombuffer(''.join(string + '\n' for string in strings).encode('UTF-8'), dtype=np.uint8)
+
+def _split_strings(data):
+    return data.tobytes().decode('UTF-8').split('\n')[:-1]
+
 
 def strip_tags(sentences):
     '''